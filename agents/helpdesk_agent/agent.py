@@ -1,6 +1,6 @@
 import json
 import os
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 
 from dotenv import load_dotenv
 import requests
@@ -20,6 +20,8 @@ def _env(name: str, default: str) -> str:
 
 GEMINI_MODEL = _env("GEMINI_MODEL", "gemini-2.0-flash")
 TOOL_SERVICE_URL = _env("TOOL_SERVICE_URL", "http://localhost:7001").rstrip("/")
+# Character budget per KB result; bodies are trimmed to the passages matching the query. 0 returns full bodies
+KB_SNIPPET_CHARS = int(_env("KB_SNIPPET_CHARS", "600"))
 
 
 def _http_get(path: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
@@ -43,22 +45,47 @@ def _http_patch(path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
     return r.json()
 
 
-def kb_search(query: str, top_k: int = 3) -> Dict[str, Any]:
+def kb_search(query: str, top_k: int = 3, tags: Optional[List[str]] = None) -> Dict[str, Any]:
     """Search a helpdesk knowledge base via REST API.
 
     Args:
       query: search query
       top_k: max number of results
+      tags: optional article tags to restrict the search to, for example the affected system
     Returns:
       dict with results
     """
+    params: Dict[str, Any] = {"q": query, "top_k": top_k, "snippet_chars": KB_SNIPPET_CHARS}
     try:
-        data = _http_get("/kb/search", params={"q": query, "top_k": top_k})
+        if tags:
+            data = _http_get("/kb/search", params={**params, "tags": tags})
+            if data.get("results"):
+                return {"status": "success", "results": data["results"]}
+        # No article carries those tags, search the whole KB instead
+        data = _http_get("/kb/search", params=params)
         return {"status": "success", "results": data.get("results", [])}
     except Exception as e:
         return {"status": "error", "error": str(e), "results": []}
 
 
+def kb_search_many(queries: List[str], top_k: int = 3) -> Dict[str, Any]:
+    """Search the helpdesk knowledge base for several phrasings in one call.
+
+    Args:
+      queries: search queries, for example reformulations of the same issue
+      top_k: max number of results per query
+    Returns:
+      dict with one results list per query, in the same order
+    """
+    try:
+        data = _http_post(
+            "/kb/search/batch", {"queries": queries, "top_k": top_k, "snippet_chars": KB_SNIPPET_CHARS}
+        )
+        return {"status": "success", "results": [r.get("results", []) for r in data.get("results", [])]}
+    except Exception as e:
+        return {"status": "error", "error": str(e), "results": []}
+
+
 def create_ticket(title: str, description: str, priority: str = "P2") -> Dict[str, Any]:
     """Create a helpdesk ticket via REST API.
 
@@ -124,6 +151,8 @@ ACTION_INSTRUCTION = """You are ActionAgent. You receive the triage JSON in {tri
 
 Behavior:
 - If recommended_action is answer_with_kb, call kb_search(kb_search_query) then give step by step guidance.
+  When entities.system is set, pass it as tags, for example kb_search(kb_search_query, tags=["vpn"]).
+- To try several phrasings, call kb_search_many once with all of them instead of repeating kb_search.
 - If recommended_action is ask_clarifying_questions, ask the questions, do not call create_ticket.
 - If recommended_action is create_ticket:
   - Do NOT create a ticket unless the user explicitly approves, for example: "approved", "create the ticket".
@@ -155,7 +184,7 @@ action_agent = LlmAgent(
     name="ActionAgent",
     model=Gemini(model=GEMINI_MODEL, retry_options=retry_config),
     instruction=ACTION_INSTRUCTION,
-    tools=[kb_search, create_ticket, get_ticket, update_ticket_status],
+    tools=[kb_search, kb_search_many, create_ticket, get_ticket, update_ticket_status],
     description="Uses tools to resolve issues and drafts or creates tickets with approval.",
 )
 
@@ -0,0 +1,84 @@
+"""Recall vs latency of the IVF ANN index against brute-force vector search.
+
+Runs on synthetic clustered embeddings by default, so KB sizes far beyond the
+shipped sample can be measured:
+
+    python scripts/bench_ann.py --n 1000000 --nlist 4096 --nprobe 4 8 16 32
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tool_service.kb_ann import IVFIndex  # noqa: E402
+from tool_service.kb_vectors import HashingEmbedder  # noqa: E402
+
+
+def _synthetic(n: int, dim: int, topics: int, spread: float, rng: np.random.Generator) -> np.ndarray:
+    centers = rng.standard_normal((topics, dim)).astype(np.float32)
+    out = np.empty((n, dim), dtype=np.float32)
+    for start in range(0, n, 100_000):
+        end = min(n, start + 100_000)
+        labels = rng.integers(0, topics, size=end - start)
+        out[start:end] = centers[labels] + spread * rng.standard_normal((end - start, dim)).astype(np.float32)
+    out /= np.linalg.norm(out, axis=1, keepdims=True)
+    return out
+
+
+def _percentile_ms(samples: List[float], p: float) -> float:
+    return float(np.percentile(np.array(samples) * 1000.0, p))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--n", type=int, default=200_000)
+    parser.add_argument("--dim", type=int, default=512)
+    parser.add_argument("--topics", type=int, default=2000)
+    parser.add_argument("--spread", type=float, default=1.5, help="within-topic noise, higher is harder")
+    parser.add_argument("--nlist", type=int, default=0, help="default ~4*sqrt(n)")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = _synthetic(args.n, args.dim, args.topics, args.spread, rng)
+    queries = vectors[rng.choice(args.n, size=args.queries, replace=False)]
+    queries = queries + (0.5 / np.sqrt(args.dim)) * rng.standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    nlist = args.nlist or int(4 * np.sqrt(args.n))
+    t0 = time.perf_counter()
+    ivf = IVFIndex.build(vectors, HashingEmbedder(dim=args.dim), nlist=nlist, seed=args.seed)
+    print(f"docs={args.n} dim={args.dim} nlist={ivf.nlist} build={time.perf_counter() - t0:.1f}s")
+
+    truth = []
+    brute: List[float] = []
+    for q in queries:
+        t = time.perf_counter()
+        scores = vectors @ q
+        top = np.argpartition(-scores, args.top_k - 1)[: args.top_k]
+        brute.append(time.perf_counter() - t)
+        truth.append(set(int(d) for d in top))
+    print(f"brute-force      recall@{args.top_k}=1.000 p50={_percentile_ms(brute, 50):7.2f}ms p99={_percentile_ms(brute, 99):7.2f}ms")
+
+    for nprobe in args.nprobe:
+        hits = 0
+        lat: List[float] = []
+        for q, expected in zip(queries, truth):
+            t = time.perf_counter()
+            got = ivf.search_vector(q, top_k=args.top_k, nprobe=nprobe)
+            lat.append(time.perf_counter() - t)
+            hits += len(expected.intersection(d for d, _ in got))
+        recall = hits / (len(truth) * args.top_k)
+        print(f"ivf nprobe={nprobe:<4} recall@{args.top_k}={recall:.3f} p50={_percentile_ms(lat, 50):7.2f}ms p99={_percentile_ms(lat, 99):7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
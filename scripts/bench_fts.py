@@ -0,0 +1,114 @@
+"""Build time, query latency and memory of the fts5 KB backend against the in-memory index.
+
+Runs on a synthetic Zipf-distributed KB so sizes beyond the shipped sample
+can be measured:
+
+    python scripts/bench_fts.py --docs 200000 --queries 500
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, List, Tuple, TypeVar
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tool_service.kb_fts import FTSIndex, build_fts  # noqa: E402
+from tool_service.kb_index import KBIndex  # noqa: E402
+from tool_service.kb_loader import KBFileReader  # noqa: E402
+from tool_service.tokenizer import get_tokenizer  # noqa: E402
+
+T = TypeVar("T")
+
+
+def _write_kb(path: str, docs: int, vocab: int, body_words: int, rng: random.Random) -> List[str]:
+    words = [f"term{i}" for i in range(vocab)]
+    weights = [1.0 / (i + 1) for i in range(vocab)]
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(docs):
+            art = {
+                "id": f"kb-{i}",
+                "title": " ".join(rng.choices(words, weights, k=6)),
+                "tags": rng.choices(words, weights, k=3),
+                "body": " ".join(rng.choices(words, weights, k=body_words)),
+            }
+            f.write(json.dumps(art) + "\n")
+    return words
+
+
+def _timed(fn: Callable[[], T], trace: bool) -> Tuple[T, float, int]:
+    """Result, seconds and, when tracing, bytes still allocated by `fn` afterwards."""
+    if trace:
+        tracemalloc.start()
+    t = time.perf_counter()
+    out = fn()
+    elapsed = time.perf_counter() - t
+    held = 0
+    if trace:
+        held = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    return out, elapsed, held
+
+
+def _latency(label: str, rank: Callable[[str], List[Tuple[int, float]]], queries: List[str]) -> List[List[int]]:
+    results = []
+    lat: List[float] = []
+    for q in queries:
+        t = time.perf_counter()
+        results.append([d for d, _ in rank(q)])
+        lat.append(time.perf_counter() - t)
+    lat.sort()
+    p50 = lat[len(lat) // 2] * 1000.0
+    p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1000.0
+    print(f"{label:<10} p50={p50:7.2f}ms p99={p99:7.2f}ms")
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=50_000)
+    parser.add_argument("--vocab", type=int, default=50_000)
+    parser.add_argument("--body-words", type=int, default=120)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--scorer", default="bm25", choices=["bm25", "bm25f"])
+    parser.add_argument("--trace-memory", action="store_true", help="measure the in-memory index heap (slower)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    tokenize = get_tokenizer("simple")
+    with tempfile.TemporaryDirectory() as tmp:
+        kb_path = os.path.join(tmp, "kb.jsonl")
+        words = _write_kb(kb_path, args.docs, args.vocab, args.body_words, rng)
+        weights = [1.0 / (i + 1) for i in range(len(words))]
+        queries = [" ".join(rng.choices(words, weights, k=rng.randint(1, 4))) for _ in range(args.queries)]
+        print(f"docs={args.docs} kb={os.path.getsize(kb_path) / 1e6:.1f}MB queries={len(queries)}")
+
+        index, build_s, heap = _timed(
+            lambda: KBIndex(KBFileReader(kb_path), tokenize, scorer=args.scorer), args.trace_memory
+        )
+        heap_note = f" heap={heap / 1e6:.0f}MB" if args.trace_memory else ""
+        print(f"memory     build={build_s:6.1f}s{heap_note}")
+
+        db_path = os.path.join(tmp, "kb_fts.sqlite3")
+        _, build_s, _ = _timed(lambda: build_fts(kb_path, db_path), False)
+        print(f"fts5       build={build_s:6.1f}s disk={os.path.getsize(db_path) / 1e6:.0f}MB")
+        fts = FTSIndex(db_path, tokenize, scorer=args.scorer, prefix_min=0)
+
+        mem_results = _latency("memory", lambda q: index.rank(q, args.top_k), queries)
+        fts_results = _latency("fts5", lambda q: fts.rank(q, args.top_k), queries)
+        overlap = sum(len(set(a) & set(b)) for a, b in zip(mem_results, fts_results))
+        total = sum(len(a) for a in mem_results) or 1
+        print(f"top-{args.top_k} agreement memory vs fts5: {overlap / total:.3f}")
+
+        prefix = FTSIndex(db_path, tokenize, scorer=args.scorer, prefix_min=3)
+        _latency("fts5 pre", lambda q: prefix.rank(q, args.top_k), queries)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Ticket store throughput with a connection per call against the pooled, WAL-tuned connections.
+
+Runs the same mix of ticket inserts, lookups, status updates and listings
+from several threads against a fresh database for each strategy:
+
+    python scripts/bench_sqlite.py --threads 16 --ops 2000 --write-ratio 0.3
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tool_service.db_pool import ConnectionPool  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tickets (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    description TEXT NOT NULL,
+    priority TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+
+def _per_call(path: str) -> Callable[[], sqlite3.Connection]:
+    # What Storage._connect used to do: a new, untuned connection for every call
+    def connect() -> sqlite3.Connection:
+        conn = sqlite3.connect(path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    return connect
+
+
+def _insert(conn: sqlite3.Connection, ticket_id: str) -> None:
+    with conn:
+        conn.execute(
+            "INSERT INTO tickets (id, title, description, priority, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (ticket_id, "VPN drops", "VPN disconnects every few minutes", "P2", "open", time.time()),
+        )
+
+
+def _run(
+    connect: Callable[[], sqlite3.Connection], ids: List[str], threads: int, ops: int, write_ratio: float, seed: int
+) -> Dict[str, List[float]]:
+    lat: Dict[str, List[float]] = {"insert": [], "get": [], "update": [], "list": [], "error": []}
+    lock = threading.Lock()
+
+    def worker(n: int) -> None:
+        rng = random.Random(seed + n)
+        local: Dict[str, List[float]] = {k: [] for k in lat}
+        for _ in range(ops):
+            r = rng.random()
+            op = "insert" if r < write_ratio / 2 else "update" if r < write_ratio else rng.choice(["get", "list"])
+            start = time.perf_counter()
+            try:
+                conn = connect()
+                if op == "insert":
+                    _insert(conn, uuid.uuid4().hex)
+                elif op == "update":
+                    with conn:
+                        conn.execute("UPDATE tickets SET status = ? WHERE id = ?", ("in_progress", rng.choice(ids)))
+                elif op == "get":
+                    with conn:
+                        conn.execute("SELECT * FROM tickets WHERE id = ?", (rng.choice(ids),)).fetchone()
+                else:
+                    with conn:
+                        conn.execute("SELECT * FROM tickets ORDER BY created_at DESC LIMIT 20").fetchall()
+            except sqlite3.OperationalError:
+                op = "error"
+            local[op].append(time.perf_counter() - start)
+        with lock:
+            for k, v in local.items():
+                lat[k].extend(v)
+
+    pool = [threading.Thread(target=worker, args=(n,)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    return lat
+
+
+def _report(label: str, lat: Dict[str, List[float]], elapsed: float) -> None:
+    done = sum(len(v) for k, v in lat.items() if k != "error")
+    parts = []
+    for op in ("insert", "update", "get", "list"):
+        samples = sorted(lat[op])
+        if samples:
+            p50 = samples[len(samples) // 2] * 1000.0
+            p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000.0
+            parts.append(f"{op} p50={p50:.2f}ms p99={p99:.2f}ms")
+    print(f"{label:<9} {done / elapsed:8.0f} ops/s errors={len(lat['error'])}  " + "  ".join(parts))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000, help="tickets preloaded before measuring")
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=1000, help="operations per thread")
+    parser.add_argument("--write-ratio", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for label in ("per-call", "pooled"):
+            path = os.path.join(tmp, f"{label}.sqlite3")
+            pool = ConnectionPool(path) if label == "pooled" else None
+            connect = pool.connection if pool is not None else _per_call(path)
+            conn = connect()
+            conn.execute(SCHEMA)
+            ids = [uuid.uuid4().hex for _ in range(args.rows)]
+            with conn:
+                conn.executemany(
+                    "INSERT INTO tickets (id, title, description, priority, status, created_at) "
+                    "VALUES (?, 'seed', 'seeded ticket', 'P3', 'open', ?)",
+                    [(ticket_id, float(i)) for i, ticket_id in enumerate(ids)],
+                )
+            start = time.perf_counter()
+            lat = _run(connect, ids, args.threads, args.ops, args.write_ratio, args.seed)
+            _report(label, lat, time.perf_counter() - start)
+            if pool is not None:
+                pool.close()
+
+
+if __name__ == "__main__":
+    main()
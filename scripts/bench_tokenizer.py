@@ -0,0 +1,68 @@
+"""Micro-benchmark of the KB tokenizers against the original per-character scan.
+
+    python scripts/bench_tokenizer.py --docs 20000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Callable, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tool_service.kb_index import article_text  # noqa: E402
+from tool_service.tokenizer import get_tokenizer  # noqa: E402
+
+
+def legacy_tokenize(text: str) -> List[str]:
+    # Storage._tokenize as it was before the tokenizer module
+    out: List[str] = []
+    cur: List[str] = []
+    for ch in text.lower():
+        if ch.isalnum():
+            cur.append(ch)
+        else:
+            if cur:
+                out.append("".join(cur))
+                cur = []
+    if cur:
+        out.append("".join(cur))
+    return out
+
+
+def _bench(label: str, fn: Callable[[], object], chars: int, repeat: int) -> None:
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    print(f"{label:<24} {best * 1000:9.1f} ms  {chars / best / 1e6:7.1f} Mchar/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--kb", default=os.path.join(os.path.dirname(__file__), "..", "tool_service", "data", "kb_articles.json"))
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with open(args.kb, "r", encoding="utf-8") as f:
+        base = [article_text(a) for a in json.load(f)]
+    texts = [base[i % len(base)] for i in range(args.docs)]
+    chars = sum(len(t) for t in texts)
+    print(f"docs={len(texts)} chars={chars}")
+
+    simple = get_tokenizer("simple")
+    english = get_tokenizer("english")
+    assert [simple(t) for t in base] == [legacy_tokenize(t) for t in base]
+
+    _bench("legacy per-char", lambda: [legacy_tokenize(t) for t in texts], chars, args.repeat)
+    _bench("simple", lambda: [simple(t) for t in texts], chars, args.repeat)
+    _bench("simple batch", lambda: simple.tokenize_batch(texts), chars, args.repeat)
+    _bench("english", lambda: [english(t) for t in texts], chars, args.repeat)
+    _bench("english batch", lambda: english.tokenize_batch(texts), chars, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Check with EXPLAIN QUERY PLAN that every ticket listing filter is served by an index.
+
+Creates a scratch ticket database through Storage, fills it, runs ANALYZE
+and fails if any `list_tickets` query, first or later page, scans the table
+or sorts in a temp B-tree:
+
+    python scripts/check_ticket_plans.py --rows 100000
+"""
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+from typing import List, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tool_service.storage import Storage, ticket_list_query  # noqa: E402
+
+KB_PATH = os.path.join(os.path.dirname(__file__), "..", "tool_service", "data", "kb_articles.json")
+STATUSES = ["open", "in_progress", "blocked", "resolved", "closed"]
+PRIORITIES = ["P1", "P2", "P3", "P4"]
+
+
+def _problems(plan: List[str]) -> List[str]:
+    bad = []
+    for step in plan:
+        if step.startswith("SCAN tickets") and "USING" not in step:
+            bad.append(step)
+        if "TEMP B-TREE" in step:
+            bad.append(step)
+    return bad
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "tickets.sqlite3")
+        storage = Storage(db_path, KB_PATH)
+        storage.close()
+        conn = sqlite3.connect(db_path)
+        with conn:
+            # Mostly closed tickets, like a long-lived helpdesk
+            conn.executemany(
+                "INSERT INTO tickets (id, title, description, priority, status, created_at) "
+                "VALUES (?, 'seed', 'seeded ticket', ?, ?, ?)",
+                [
+                    (f"t_{i:012d}", rng.choice(PRIORITIES), rng.choices(STATUSES, [1, 1, 1, 2, 15])[0], float(i))
+                    for i in range(args.rows)
+                ],
+            )
+        conn.execute("ANALYZE")
+        statuses: List[Optional[str]] = [None, *STATUSES]
+        priorities: List[Optional[str]] = [None, *PRIORITIES]
+        ranges = [(None, None), (args.rows / 2, None), (None, args.rows / 2), (args.rows / 4, args.rows / 2)]
+        # A cursor deep into the table, as when walking every page
+        cursors: List[Optional[Tuple[float, str]]] = [None, (args.rows / 3, f"t_{args.rows // 3:012d}")]
+        for status, priority, (after, before), cursor in itertools.product(statuses, priorities, ranges, cursors):
+            sql, params = ticket_list_query(20, status, priority, after, before, cursor)
+            plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params)]
+            bad = _problems(plan)
+            label = f"status={status} priority={priority} created_after={after} created_before={before} cursor={cursor}"
+            if bad:
+                failures += 1
+                print(f"FAIL {label}: {'; '.join(plan)}")
+            else:
+                print(f"ok   {label}: {'; '.join(plan)}")
+        conn.close()
+    if failures:
+        sys.exit(f"{failures} ticket listing queries are not index-backed")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,31 +1,124 @@
 import os
-from typing import Any, Dict, List
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import FastAPI, HTTPException, Query
+from pydantic import BaseModel, Field, ValidationError
 
-from .storage import Storage
+from .kb_index import SCORERS, parse_field_boosts
+from .kb_shards import GenerationRetired
+from .storage import KB_MODES, Storage
 
 
-KB_PATH = os.path.join(os.path.dirname(__file__), "data", "kb_articles.json")
+# A .jsonl / .ndjson path is read as one article per line
+KB_PATH = os.getenv("KB_PATH", os.path.join(os.path.dirname(__file__), "data", "kb_articles.json"))
 DB_PATH = os.path.join(os.path.dirname(__file__), "data", "tickets.sqlite3")
+INDEX_DIR = os.path.join(os.path.dirname(__file__), "..", "runtime", "index")
+# "memory" or "fts5", the latter keeps the KB in an SQLite FTS5 file under INDEX_DIR
+KB_BACKEND = os.getenv("KB_BACKEND", "memory")
+# With fts5, query terms at least this long also match as prefixes, 0 disables
+KB_FTS_PREFIX_MIN = int(os.getenv("KB_FTS_PREFIX_MIN", "3"))
+# Binary index from `python -m tool_service.kb_index_file`, served instead of indexing KB_PATH at startup
+KB_INDEX_FILE = os.getenv("KB_INDEX_FILE", "")
+KB_SCORER = os.getenv("KB_SCORER", "bm25f")
+# Per-field weights for the bm25f scorer, e.g. "title=3,tags=2.5,body=1"
+KB_FIELD_BOOSTS = parse_field_boosts(os.getenv("KB_FIELD_BOOSTS", ""))
+KB_TOKENIZER = os.getenv("KB_TOKENIZER", "simple")
+KB_VECTORS = os.getenv("KB_VECTORS", "0") == "1"
+# Keep article bodies in a shared memory-mapped file instead of each worker's heap
+KB_COMPACT_STORE = os.getenv("KB_COMPACT_STORE", "1") == "1"
+# IVF lists probed per vector query, 0 disables the ANN index
+KB_ANN_NPROBE = int(os.getenv("KB_ANN_NPROBE", "0"))
+# Query result cache, 0 entries disables it
+KB_CACHE_SIZE = int(os.getenv("KB_CACHE_SIZE", "1024"))
+KB_CACHE_TTL = float(os.getenv("KB_CACHE_TTL", "300"))
+# Expand misspelled query terms to their closest indexed terms
+KB_FUZZY = os.getenv("KB_FUZZY", "1") == "1"
+# Worker processes serving KB shards, 0 or 1 keeps lexical search in-process
+KB_SHARDS = int(os.getenv("KB_SHARDS", "0"))
+# Most queries accepted by one /kb/search/batch request
+KB_BATCH_MAX = int(os.getenv("KB_BATCH_MAX", "1000"))
+# Recent queries per stage behind the latency summary on /kb/stats
+KB_TIMING_WINDOW = int(os.getenv("KB_TIMING_WINDOW", "1024"))
+# Most tickets accepted by one POST /tickets/bulk request
+TICKET_BULK_MAX = int(os.getenv("TICKET_BULK_MAX", "1000"))
+# Seconds between KB file change checks, 0 disables the watcher
+KB_RELOAD_INTERVAL = float(os.getenv("KB_RELOAD_INTERVAL", "0"))
 
-storage = Storage(db_path=DB_PATH, kb_path=KB_PATH)
-app = FastAPI(title="Agent Tool Service", version="0.1.0")
+storage = Storage(
+    db_path=DB_PATH,
+    kb_path=KB_PATH,
+    kb_scorer=KB_SCORER,
+    kb_tokenizer=KB_TOKENIZER,
+    kb_vectors=KB_VECTORS,
+    index_dir=INDEX_DIR,
+    compact_store=KB_COMPACT_STORE,
+    ann_nprobe=KB_ANN_NPROBE,
+    cache_size=KB_CACHE_SIZE,
+    cache_ttl=KB_CACHE_TTL,
+    kb_shards=KB_SHARDS,
+    kb_fuzzy=KB_FUZZY,
+    kb_field_boosts=KB_FIELD_BOOSTS,
+    index_file=KB_INDEX_FILE or None,
+    kb_backend=KB_BACKEND,
+    fts_prefix_min=KB_FTS_PREFIX_MIN,
+    timing_window=KB_TIMING_WINDOW,
+)
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    if KB_RELOAD_INTERVAL > 0:
+        storage.start_kb_watcher(KB_RELOAD_INTERVAL)
+    try:
+        yield
+    finally:
+        storage.close()
+
+
+app = FastAPI(title="Agent Tool Service", version="0.1.0", lifespan=lifespan)
 
 
 class KBSearchResponse(BaseModel):
     results: List[Dict[str, Any]]
+    timings_ms: Dict[str, float] = Field(default_factory=dict)
+    cached: bool = False
+    stages_ms: Dict[str, float] = Field(default_factory=dict)
+    explain: Optional[List[Dict[str, Any]]] = None
+
+
+class KBBatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=KB_BATCH_MAX)
+    top_k: int = 3
+    scorer: Optional[str] = None
+    mode: str = "lexical"
+    snippet_chars: int = Field(0, ge=0, le=20000)
+    tags: List[str] = Field(default_factory=list)
+    category: List[str] = Field(default_factory=list)
+
+
+class KBBatchSearchResponse(BaseModel):
+    results: List[KBSearchResponse]
+
+
+class KBReloadResponse(BaseModel):
+    reloaded: bool
+    version: str
+    articles: int
+
+
+PRIORITY_PATTERN = r"^P[1-4]$"
+STATUS_PATTERN = r"^(open|in_progress|blocked|resolved|closed)$"
 
 
 class TicketCreateRequest(BaseModel):
     title: str = Field(..., min_length=3)
     description: str = Field(..., min_length=10)
-    priority: str = Field("P2", pattern=r"^P[1-4]$")
+    priority: str = Field("P2", pattern=PRIORITY_PATTERN)
 
 
 class TicketUpdateRequest(BaseModel):
-    status: str = Field(..., pattern=r"^(open|in_progress|blocked|resolved|closed)$")
+    status: str = Field(..., pattern=STATUS_PATTERN)
 
 
 class TicketResponse(BaseModel):
@@ -37,17 +130,112 @@ class TicketResponse(BaseModel):
     created_at: float
 
 
+class TicketListResponse(BaseModel):
+    tickets: List[TicketResponse]
+    next_cursor: Optional[str] = None
+
+
+class TicketBulkCreateRequest(BaseModel):
+    # Validated one by one so a bad item is reported without rejecting the others
+    tickets: List[Dict[str, Any]] = Field(..., min_length=1, max_length=TICKET_BULK_MAX)
+
+
+class TicketBulkItemResult(BaseModel):
+    index: int
+    ticket: Optional[TicketResponse] = None
+    error: Optional[str] = None
+
+
+class TicketBulkCreateResponse(BaseModel):
+    created: int
+    failed: int
+    results: List[TicketBulkItemResult]
+
+
 @app.get("/health")
 def health() -> Dict[str, str]:
     return {"status": "ok"}
 
 
+def _check_search_params(scorer: Optional[str], mode: str) -> None:
+    if scorer is not None and scorer not in SCORERS:
+        raise HTTPException(status_code=400, detail=f"scorer must be one of {', '.join(SCORERS)}")
+    if mode not in KB_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(KB_MODES)}")
+
+
 @app.get("/kb/search", response_model=KBSearchResponse)
-def kb_search(q: str, top_k: int = 3) -> KBSearchResponse:
+def kb_search(
+    q: str,
+    top_k: int = 3,
+    scorer: Optional[str] = None,
+    mode: str = "lexical",
+    snippet_chars: int = Query(0, ge=0, le=20000),
+    tags: Optional[List[str]] = Query(None),
+    category: Optional[List[str]] = Query(None),
+    explain: bool = False,
+) -> KBSearchResponse:
+    _check_search_params(scorer, mode)
     if not q.strip():
         return KBSearchResponse(results=[])
-    results = storage.kb_search(query=q, top_k=top_k)
-    return KBSearchResponse(results=results)
+    try:
+        res = storage.kb_query(
+            query=q,
+            top_k=top_k,
+            scorer=scorer,
+            mode=mode,
+            snippet_chars=snippet_chars,
+            tags=tags,
+            categories=category,
+            explain=explain,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except GenerationRetired as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    return KBSearchResponse(
+        results=res.results,
+        timings_ms=res.timings_ms,
+        cached=res.cached,
+        stages_ms=res.stages_ms,
+        explain=res.explain,
+    )
+
+
+@app.post("/kb/search/batch", response_model=KBBatchSearchResponse)
+def kb_search_batch(req: KBBatchSearchRequest) -> KBBatchSearchResponse:
+    _check_search_params(req.scorer, req.mode)
+    try:
+        batch = storage.kb_query_batch(
+            queries=req.queries,
+            top_k=req.top_k,
+            scorer=req.scorer,
+            mode=req.mode,
+            snippet_chars=req.snippet_chars,
+            tags=req.tags,
+            categories=req.category,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except GenerationRetired as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    return KBBatchSearchResponse(
+        results=[KBSearchResponse(results=r.results, timings_ms=r.timings_ms, cached=r.cached) for r in batch]
+    )
+
+
+@app.get("/kb/stats")
+def kb_stats() -> Dict[str, Any]:
+    return {"kb": storage.kb_info(), "cache": storage.kb_cache_stats(), "timings": storage.kb_timing_stats()}
+
+
+@app.post("/admin/kb/reload", response_model=KBReloadResponse)
+def reload_kb(force: bool = False) -> KBReloadResponse:
+    try:
+        reloaded = storage.reload_kb(force=force)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=500, detail=f"KB reload failed: {e}")
+    return KBReloadResponse(reloaded=reloaded, **storage.kb_info())
 
 
 @app.post("/tickets", response_model=TicketResponse)
@@ -56,9 +244,48 @@ def create_ticket(req: TicketCreateRequest) -> TicketResponse:
     return TicketResponse(**t.__dict__)
 
 
-@app.get("/tickets", response_model=List[TicketResponse])
-def list_tickets(limit: int = 20) -> List[TicketResponse]:
-    return [TicketResponse(**t.__dict__) for t in storage.list_tickets(limit=limit)]
+@app.post("/tickets/bulk", response_model=TicketBulkCreateResponse)
+def create_tickets(req: TicketBulkCreateRequest) -> TicketBulkCreateResponse:
+    results: List[TicketBulkItemResult] = []
+    valid: List[TicketCreateRequest] = []
+    for i, item in enumerate(req.tickets):
+        try:
+            valid.append(TicketCreateRequest.model_validate(item))
+            results.append(TicketBulkItemResult(index=i))
+        except ValidationError as e:
+            detail = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            results.append(TicketBulkItemResult(index=i, error=detail))
+    created = storage.create_tickets([(t.title, t.description, t.priority) for t in valid]) if valid else []
+    pending = iter(created)
+    for r in results:
+        if r.error is None:
+            r.ticket = TicketResponse(**next(pending).__dict__)
+    return TicketBulkCreateResponse(created=len(created), failed=len(results) - len(created), results=results)
+
+
+@app.get("/tickets", response_model=TicketListResponse)
+def list_tickets(
+    limit: int = Query(20, ge=1, le=1000),
+    status: Optional[str] = Query(None, pattern=STATUS_PATTERN),
+    priority: Optional[str] = Query(None, pattern=PRIORITY_PATTERN),
+    created_after: Optional[float] = None,
+    created_before: Optional[float] = None,
+    cursor: Optional[str] = None,
+) -> TicketListResponse:
+    try:
+        page = storage.list_tickets_page(
+            limit=limit,
+            status=status,
+            priority=priority,
+            created_after=created_after,
+            created_before=created_before,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return TicketListResponse(
+        tickets=[TicketResponse(**t.__dict__) for t in page.tickets], next_cursor=page.next_cursor
+    )
 
 
 @app.get("/tickets/{ticket_id}", response_model=TicketResponse)
@@ -0,0 +1,69 @@
+import sqlite3
+import threading
+from typing import Dict, List, Tuple, Union
+
+
+# Applied once to every new connection. WAL lets readers run alongside the
+# writer, NORMAL sync is durable in WAL mode except on power loss, and the
+# busy timeout makes writers queue instead of failing with "database is locked".
+DEFAULT_PRAGMAS: Dict[str, Union[int, str]] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    # Negative is KiB: 16 MiB of page cache per connection
+    "cache_size": -16384,
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+class ConnectionPool:
+    """One SQLite connection per thread, opened on first use and reused after.
+
+    Connections are tuned once with `pragmas` instead of on every call, and
+    those of threads that have exited are closed when the next one is opened.
+    `close()` closes every connection but leaves the pool usable: the next
+    call from any thread opens a fresh one.
+    """
+
+    def __init__(self, path: str, pragmas: Dict[str, Union[int, str]] = DEFAULT_PRAGMAS) -> None:
+        self.path = path
+        self.pragmas = dict(pragmas)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._conns: List[Tuple[threading.Thread, sqlite3.Connection]] = []
+        # Bumped by close(), so thread-local connections from before it are not reused
+        self._generation = 0
+
+    def _open(self) -> sqlite3.Connection:
+        # Only the owning thread uses a connection, but close() may run on another one
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def connection(self) -> sqlite3.Connection:
+        cached = getattr(self._local, "conn", None)
+        if cached is not None and cached[0] == self._generation:
+            return cached[1]
+        conn = self._open()
+        with self._lock:
+            live = []
+            for thread, other in self._conns:
+                if thread.is_alive():
+                    live.append((thread, other))
+                else:
+                    other.close()
+            live.append((threading.current_thread(), conn))
+            self._conns = live
+            generation = self._generation
+        self._local.conn = (generation, conn)
+        return conn
+
+    def close(self) -> None:
+        with self._lock:
+            self._generation += 1
+            conns, self._conns = self._conns, []
+        for _, conn in conns:
+            conn.close()
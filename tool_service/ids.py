@@ -0,0 +1,54 @@
+import os
+import secrets
+import threading
+import time
+from typing import Optional
+
+# Crockford base32, which sorts in the same order as the values it encodes
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_RANDOM_BITS = 80
+
+
+def _encode(value: int, length: int) -> str:
+    out = []
+    for _ in range(length):
+        value, digit = divmod(value, 32)
+        out.append(_ALPHABET[digit])
+    return "".join(reversed(out))
+
+
+class ULIDGenerator:
+    """Monotonic ULIDs: 48 bits of Unix ms followed by 80 random bits, 26 characters.
+
+    Ids sort by creation time. Within one millisecond, or if the clock steps
+    back, the previous id's random part is incremented instead of redrawn, so
+    ids from one generator never repeat and keep strictly increasing. Forked
+    workers start from fresh random state, and 80 random bits keep separate
+    processes from colliding.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self) -> None:
+        self._lock = threading.Lock()
+        self._last_ms = -1
+
+    def new(self, timestamp: Optional[float] = None) -> str:
+        ms = int((time.time() if timestamp is None else timestamp) * 1000)
+        with self._lock:
+            if ms <= self._last_ms:
+                ms = self._last_ms
+                rand = self._last_random + 1
+                if rand >> _RANDOM_BITS:
+                    # Random part exhausted within this millisecond, borrow the next one
+                    ms += 1
+                    rand = secrets.randbits(_RANDOM_BITS)
+            else:
+                rand = secrets.randbits(_RANDOM_BITS)
+            self._last_ms, self._last_random = ms, rand
+        return _encode(ms, 10) + _encode(rand, 16)
@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from .kb_index import article_text
+from .kb_loader import KBFileReader, file_version
+from .kb_vectors import HashingEmbedder, VectorIndex, load_or_build
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, batch_size: int = 65536) -> np.ndarray:
+    out = np.empty(vectors.shape[0], dtype=np.int32)
+    for start in range(0, vectors.shape[0], batch_size):
+        block = np.asarray(vectors[start : start + batch_size])
+        out[start : start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+    return out
+
+
+def train_centroids(vectors: np.ndarray, nlist: int, iters: int = 20, train_size: int = 256, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on a sample of at most `train_size` points per list."""
+    rng = np.random.default_rng(seed)
+    n = vectors.shape[0]
+    sample_ids = rng.choice(n, size=min(n, nlist * train_size), replace=False)
+    sample = np.asarray(vectors[np.sort(sample_ids)], dtype=np.float32)
+    centroids = sample[rng.choice(sample.shape[0], size=nlist, replace=False)].copy()
+    for _ in range(iters):
+        labels = _assign(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, sample)
+        counts = np.bincount(labels, minlength=nlist)
+        empty = counts == 0
+        if empty.any():
+            # Re-seed empty lists from random points so every list stays usable
+            sums[empty] = sample[rng.choice(sample.shape[0], size=int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        centroids = sums / np.maximum(norms, 1e-12)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """Inverted-file ANN index over the KB embeddings, in pure NumPy.
+
+    Vectors are stored grouped by their nearest centroid, so a query scores
+    `nlist` centroids, then only the `nprobe` closest lists, each a contiguous
+    slice. Raising `nprobe` trades latency for recall.
+    """
+
+    def __init__(
+        self,
+        centroids: np.ndarray,
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        vectors: np.ndarray,
+        embedder: HashingEmbedder,
+        nprobe: int = 8,
+    ) -> None:
+        self.centroids = centroids
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.vectors = vectors
+        self.embedder = embedder
+        self.nprobe = nprobe
+
+    def __len__(self) -> int:
+        return int(self.doc_ids.shape[0])
+
+    @property
+    def nlist(self) -> int:
+        return int(self.centroids.shape[0])
+
+    @classmethod
+    def build(
+        cls, vectors: np.ndarray, embedder: HashingEmbedder, nlist: int, iters: int = 20, seed: int = 0
+    ) -> "IVFIndex":
+        nlist = max(1, min(nlist, vectors.shape[0]))
+        centroids = train_centroids(vectors, nlist, iters=iters, seed=seed)
+        labels = _assign(vectors, centroids)
+        order = np.argsort(labels, kind="stable").astype(np.int64)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=nlist), out=offsets[1:])
+        grouped = np.ascontiguousarray(np.asarray(vectors)[order], dtype=np.float32)
+        return cls(centroids, offsets, order, grouped, embedder)
+
+    def save(self, base_path: str) -> None:
+        os.makedirs(os.path.dirname(base_path), exist_ok=True)
+        tmp = f"{base_path}.tmp.{os.getpid()}"
+        np.savez(f"{tmp}.npz", centroids=self.centroids, offsets=self.offsets, doc_ids=self.doc_ids)
+        np.save(f"{tmp}.npy", self.vectors)
+        os.replace(f"{tmp}.npy", f"{base_path}.npy")
+        os.replace(f"{tmp}.npz", f"{base_path}.npz")
+
+    @classmethod
+    def load(cls, base_path: str, embedder: HashingEmbedder, nprobe: int = 8) -> "IVFIndex":
+        with np.load(f"{base_path}.npz") as meta:
+            centroids, offsets, doc_ids = meta["centroids"], meta["offsets"], meta["doc_ids"]
+        vectors = np.load(f"{base_path}.npy", mmap_mode="r")
+        if vectors.shape[1] != embedder.dim or centroids.shape[1] != embedder.dim:
+            raise ValueError(f"IVF index {base_path} does not match embedder dim {embedder.dim}")
+        return cls(centroids, offsets, doc_ids, vectors, embedder, nprobe=nprobe)
+
+    def search_vector(self, q: np.ndarray, top_k: int = 3, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        if len(self) == 0:
+            return []
+        nprobe = max(1, min(nprobe or self.nprobe, self.nlist))
+        centroid_scores = self.centroids @ q
+        probes = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        ids: List[np.ndarray] = []
+        scores: List[np.ndarray] = []
+        for c in probes:
+            start, end = int(self.offsets[c]), int(self.offsets[c + 1])
+            if start == end:
+                continue
+            ids.append(self.doc_ids[start:end])
+            scores.append(self.vectors[start:end] @ q)
+        if not ids:
+            return []
+        all_ids = np.concatenate(ids)
+        all_scores = np.concatenate(scores)
+        k = min(max(1, top_k), all_scores.shape[0])
+        top = np.argpartition(-all_scores, k - 1)[:k]
+        top = top[np.lexsort((all_ids[top], -all_scores[top]))]
+        return [(int(all_ids[i]), float(all_scores[i])) for i in top if all_scores[i] > 0]
+
+    def search(self, query: str, top_k: int = 3, nprobe: Optional[int] = None) -> List[Tuple[int, float]]:
+        return self.search_vector(self.embedder.embed(query), top_k=top_k, nprobe=nprobe)
+
+
+def ivf_base_path(index_dir: str, version: str, dim: int) -> str:
+    return os.path.join(index_dir, f"kb_ivf_{version}_{dim}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the IVF ANN index for the KB offline.")
+    parser.add_argument("--kb", default=os.path.join(os.path.dirname(__file__), "data", "kb_articles.json"))
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(__file__), "..", "runtime", "index"))
+    parser.add_argument("--nlist", type=int, default=0, help="number of lists, default ~4*sqrt(n)")
+    parser.add_argument("--iters", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    version = file_version(args.kb)
+    embedder = HashingEmbedder()
+    texts = (article_text(a) for a in KBFileReader(args.kb))
+    vectors: VectorIndex = load_or_build(texts, version, args.out, embedder)
+    nlist = args.nlist or max(1, int(4 * np.sqrt(len(vectors))))
+    ivf = IVFIndex.build(vectors.matrix, embedder, nlist=nlist, iters=args.iters, seed=args.seed)
+    base = ivf_base_path(args.out, version, embedder.dim)
+    ivf.save(base)
+    print(json.dumps({"path": base, "version": version, "docs": len(ivf), "nlist": ivf.nlist,
+                      "seconds": round(time.perf_counter() - t0, 2)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+import glob
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .kb_index import DEFAULT_FIELD_BOOSTS, FIELDS, SCORERS, DocFilter, Tokenizer, article_fields, article_labels
+from .kb_loader import KBFileReader
+from .kb_timings import record_stage
+
+if TYPE_CHECKING:
+    from .kb_ann import IVFIndex
+    from .kb_fuzzy import TrigramIndex
+    from .kb_vectors import VectorIndex
+
+
+# FTS5 tokenizers closest to each KB tokenizer, used both to index and to parse queries
+FTS_TOKENIZERS = {
+    "simple": "unicode61 remove_diacritics 0",
+    "english": "porter unicode61 remove_diacritics 2",
+}
+# Articles inserted per executemany batch while building
+INSERT_BATCH = 1000
+# Bumped whenever build_fts changes the tables, so older files are rebuilt
+FTS_SCHEMA = 2
+
+
+def fts_path(index_dir: str, version: str, tokenizer: str) -> str:
+    return os.path.join(index_dir, f"kb_fts_{version}_{tokenizer}_s{FTS_SCHEMA}.sqlite3")
+
+
+def prune_fts(index_dir: str, keep: str) -> None:
+    for stale in glob.glob(os.path.join(index_dir, "kb_fts_*.sqlite3")):
+        if stale != keep:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def build_fts(kb_path: str, db_path: str, tokenizer: str = "simple") -> str:
+    """Load the KB file into a new FTS5 database at `db_path`; returns the KB version."""
+    if tokenizer not in FTS_TOKENIZERS:
+        raise ValueError(f"No FTS5 tokenizer for {tokenizer}")
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(db_path), prefix="kb_fts.", suffix=".tmp")
+    os.close(fd)
+    reader = KBFileReader(kb_path)
+    try:
+        conn = sqlite3.connect(tmp)
+        try:
+            # Contentless: columns are only indexed, articles are kept once in `articles`
+            conn.execute(
+                f"CREATE VIRTUAL TABLE kb USING fts5({', '.join(FIELDS)}, content='', prefix='2 3', "
+                f"tokenize='{FTS_TOKENIZERS[tokenizer]}')"
+            )
+            conn.execute("CREATE VIRTUAL TABLE kb_vocab USING fts5vocab(kb, 'row')")
+            conn.execute("CREATE TABLE articles (rowid INTEGER PRIMARY KEY, doc TEXT NOT NULL)")
+            conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            # Normalized tags and categories, one row per article and label, for DocFilter
+            conn.execute("CREATE TABLE labels (kind TEXT NOT NULL, label TEXT NOT NULL, rowid INTEGER NOT NULL)")
+            batch: List[Tuple[int, Dict[str, Any]]] = []
+            for doc_id, art in enumerate(reader):
+                batch.append((doc_id, art))
+                if len(batch) >= INSERT_BATCH:
+                    _insert(conn, batch)
+                    batch = []
+            _insert(conn, batch)
+            conn.execute("CREATE INDEX labels_kind_label ON labels (kind, label, rowid)")
+            conn.execute("INSERT INTO kb(kb) VALUES ('optimize')")
+            conn.executemany(
+                "INSERT INTO meta (key, value) VALUES (?, ?)",
+                [("version", reader.version or ""), ("tokenizer", tokenizer), ("articles", str(reader.count))],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        os.replace(tmp, db_path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return reader.version or ""
+
+
+def _insert(conn: sqlite3.Connection, batch: List[Tuple[int, Dict[str, Any]]]) -> None:
+    conn.executemany(
+        "INSERT INTO articles (rowid, doc) VALUES (?, ?)",
+        [(doc_id, json.dumps(art, ensure_ascii=False)) for doc_id, art in batch],
+    )
+    conn.executemany(
+        f"INSERT INTO kb (rowid, {', '.join(FIELDS)}) VALUES (?, ?, ?, ?)",
+        [(doc_id, *article_fields(art)) for doc_id, art in batch],
+    )
+    rows = []
+    for doc_id, art in batch:
+        tags, category = article_labels(art)
+        rows.extend(("tag", tag, doc_id) for tag in tags)
+        if category is not None:
+            rows.append(("category", category, doc_id))
+    conn.executemany("INSERT INTO labels (kind, label, rowid) VALUES (?, ?, ?)", rows)
+
+
+class _FTSArticles:
+    """Articles read from the FTS database by doc id, nothing kept in memory."""
+
+    def __init__(self, fts: "FTSIndex", count: int) -> None:
+        self._fts = fts
+        self._count = count
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, doc_id: int) -> Dict[str, Any]:
+        row = self._fts.conn().execute("SELECT doc FROM articles WHERE rowid = ?", (doc_id,)).fetchone()
+        if row is None:
+            raise IndexError(doc_id)
+        return json.loads(row[0])
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for (doc,) in self._fts.conn().execute("SELECT doc FROM articles ORDER BY rowid"):
+            yield json.loads(doc)
+
+
+class FTSIndex:
+    """KB search served from an SQLite FTS5 database, with the KBIndex search interface.
+
+    The database lives on disk and is opened read-only by every worker, so
+    the KB can outgrow RAM and adds no per-process index memory. Ranking is
+    FTS5's bm25(), weighted per field by the `bm25f` boosts, and query terms
+    of at least `prefix_min` characters also match as prefixes.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        tokenize: Tokenizer,
+        scorer: str = "bm25",
+        field_boosts: Optional[Dict[str, float]] = None,
+        prefix_min: int = 3,
+    ) -> None:
+        if scorer not in SCORERS:
+            raise ValueError(f"Unknown scorer: {scorer}")
+        self.path = path
+        self.tokenize = tokenize
+        self.scorer = scorer
+        self.field_boosts = dict(DEFAULT_FIELD_BOOSTS if field_boosts is None else field_boosts)
+        self.prefix_min = prefix_min
+        self._local = threading.local()
+        meta = dict(self.conn().execute("SELECT key, value FROM meta").fetchall())
+        self.version: str = meta["version"]
+        self.articles = _FTSArticles(self, int(meta["articles"]))
+        self.vectors: Optional["VectorIndex"] = None
+        self.ann: Optional["IVFIndex"] = None
+        self.fuzzy: Optional["TrigramIndex"] = None
+
+    def conn(self) -> sqlite3.Connection:
+        # One read-only connection per thread; sqlite3 connections are not shared across threads
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        return conn
+
+    def __len__(self) -> int:
+        return len(self.articles)
+
+    @contextmanager
+    def lease(self) -> Iterator[None]:
+        # Open connections keep reading a database pruned by a reload, nothing to keep loaded
+        yield
+
+    def doc_freqs(self) -> Dict[str, int]:
+        return dict(self.conn().execute("SELECT term, doc FROM kb_vocab").fetchall())
+
+    def query_terms(self, query: str) -> Set[str]:
+        # Never fuzzy-expanded: kb_vocab holds FTS5's stems, so our own tokens would look like typos
+        return set(self.tokenize(query))
+
+    def _match(self, terms: Set[str]) -> str:
+        parts = []
+        for term in sorted(terms):
+            quoted = '"' + term.replace('"', '""') + '"'
+            parts.append(f"{quoted}*" if self.prefix_min and len(term) >= self.prefix_min else quoted)
+        return " OR ".join(parts)
+
+    @staticmethod
+    def _where(doc_filter: Optional[DocFilter]) -> Tuple[str, List[str]]:
+        sql = ""
+        params: List[str] = []
+        if doc_filter is None:
+            return sql, params
+        for kind, labels in (("tag", doc_filter.tags), ("category", doc_filter.categories)):
+            if labels:
+                marks = ", ".join("?" * len(labels))
+                sql += f" AND rowid IN (SELECT rowid FROM labels WHERE kind = ? AND label IN ({marks}))"
+                params += [kind, *labels]
+        return sql, params
+
+    def rank(
+        self,
+        query: str,
+        top_k: int = 3,
+        scorer: Optional[str] = None,
+        doc_filter: Optional[DocFilter] = None,
+        stages: Optional[Dict[str, float]] = None,
+    ) -> List[Tuple[int, float]]:
+        scorer = scorer or self.scorer
+        if scorer not in SCORERS:
+            raise ValueError(f"Unknown scorer: {scorer}")
+        if scorer == "overlap":
+            raise ValueError("The fts5 KB backend ranks with bm25 or bm25f only")
+        start = time.perf_counter()
+        terms = self.query_terms(query)
+        start = record_stage(stages, "tokenize", start)
+        if not terms:
+            return []
+        weights = [self.field_boosts.get(f, 0.0) if scorer == "bm25f" else 1.0 for f in FIELDS]
+        where, params = self._where(doc_filter)
+        # bm25() is negative, lower is better; ties keep KB order like KBIndex
+        rows = self.conn().execute(
+            f"SELECT rowid, -bm25(kb, ?, ?, ?) AS score FROM kb WHERE kb MATCH ?{where} "
+            "ORDER BY score DESC, rowid LIMIT ?",
+            (*weights, self._match(terms), *params, max(1, top_k)),
+        ).fetchall()
+        # SQLite finds, scores and sorts the matches in one statement
+        record_stage(stages, "scoring", start)
+        return [(int(d), float(s)) for d, s in rows]
+
+    def explain(
+        self, query: str, doc_ids: Sequence[int], scorer: Optional[str] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        raise ValueError("The fts5 KB backend cannot break scores down by term")
+
+    def rank_batch(
+        self,
+        queries: Sequence[str],
+        top_k: int = 3,
+        scorer: Optional[str] = None,
+        doc_filter: Optional[DocFilter] = None,
+    ) -> List[Tuple[List[Tuple[int, float]], float]]:
+        out = []
+        for query in queries:
+            start = time.perf_counter()
+            top = self.rank(query, top_k, scorer, doc_filter)
+            out.append((top, (time.perf_counter() - start) * 1000.0))
+        return out
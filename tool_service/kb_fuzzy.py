@@ -0,0 +1,119 @@
+from array import array
+from typing import Container, Dict, Iterable, List, Mapping, Sequence, Set
+
+# Only this many vocabulary terms sharing the most trigrams get an edit-distance check
+MAX_CANDIDATES = 64
+# Indexed terms a misspelled query term expands to
+MAX_EXPANSIONS = 2
+
+
+def trigrams(term: str) -> Set[str]:
+    padded = f"$${term}$$"
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def max_edits(term: str) -> int:
+    """Typos tolerated for a term of this length; very short terms must match exactly."""
+    n = len(term)
+    return 0 if n < 3 else 1 if n <= 5 else 2
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Edit distance counting an adjacent transposition as one edit, or
+    `limit + 1` once it is known to exceed `limit`."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2: List[int] = []
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, start=1):
+        cur = [i] + [0] * len(b)
+        for j, cb in enumerate(b, start=1):
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cur[j] = min(cur[j], prev2[j - 2] + 1)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1] if prev[-1] <= limit else limit + 1
+
+
+class TrigramIndex:
+    """Character trigram index over the KB vocabulary for typo-tolerant lookup.
+
+    A query term missing from the vocabulary is matched against the terms
+    sharing the most trigrams with it. One edit changes at most four padded
+    trigrams, so terms sharing fewer than `len(trigrams) - 4 * d` are skipped
+    without computing an edit distance, and at most `max_candidates` are ever
+    checked.
+    """
+
+    def __init__(
+        self,
+        terms: Sequence[str],
+        doc_freqs: Sequence[int],
+        grams: Mapping[str, Sequence[int]],
+        known: Container[str],
+        max_candidates: int = MAX_CANDIDATES,
+    ) -> None:
+        # `grams` maps a trigram to the ids of the terms containing it; a term id
+        # indexes `terms` and `doc_freqs`
+        self.terms = terms
+        self.doc_freqs = doc_freqs
+        self.grams = grams
+        self._known = known
+        self.max_candidates = max_candidates
+
+    @classmethod
+    def build(cls, doc_freqs: Mapping[str, int], max_candidates: int = MAX_CANDIDATES) -> "TrigramIndex":
+        terms: List[str] = []
+        freqs = array("I")
+        grams: Dict[str, "array[int]"] = {}
+        for term, df in doc_freqs.items():
+            term_id = len(terms)
+            terms.append(term)
+            freqs.append(df)
+            for gram in trigrams(term):
+                ids = grams.get(gram)
+                if ids is None:
+                    ids = grams[gram] = array("I")
+                ids.append(term_id)
+        return cls(terms, freqs, grams, set(terms), max_candidates)
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def suggest(self, term: str, max_terms: int = MAX_EXPANSIONS) -> List[str]:
+        """Closest indexed terms to `term`, fewest edits first, then most frequent."""
+        limit = max_edits(term)
+        if limit == 0:
+            return []
+        grams = trigrams(term)
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            for term_id in self.grams.get(gram, ()):
+                shared[term_id] = shared.get(term_id, 0) + 1
+        min_shared = max(1, len(grams) - 4 * limit)
+        candidates = sorted(
+            (t for t, n in shared.items() if n >= min_shared and abs(len(self.terms[t]) - len(term)) <= limit),
+            key=lambda t: -shared[t],
+        )[: self.max_candidates]
+        scored = []
+        for term_id in candidates:
+            dist = edit_distance(term, self.terms[term_id], limit)
+            if dist <= limit:
+                scored.append((dist, -self.doc_freqs[term_id], self.terms[term_id]))
+        if not scored:
+            return []
+        scored.sort()
+        best = scored[0][0]
+        return [t for dist, _, t in scored[:max_terms] if dist == best]
+
+    def expand(self, tokens: Iterable[str]) -> Set[str]:
+        """Query terms with each unknown one replaced by its closest indexed terms."""
+        out: Set[str] = set()
+        for token in tokens:
+            if token in self._known:
+                out.add(token)
+            else:
+                out.update(self.suggest(token))
+        return out
@@ -0,0 +1,585 @@
+import heapq
+import math
+import time
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Container,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Protocol,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
+
+from .kb_timings import record_stage
+from .tokenizer import tokenize_batch
+
+if TYPE_CHECKING:
+    from .kb_ann import IVFIndex
+    from .kb_fuzzy import TrigramIndex
+    from .kb_vectors import VectorIndex
+
+
+Tokenizer = Callable[[str], List[str]]
+
+SCORERS = ("bm25f", "bm25", "overlap")
+
+# Article fields indexed separately for field-weighted scoring
+FIELDS = ("title", "tags", "body")
+DEFAULT_FIELD_BOOSTS: Dict[str, float] = {"title": 3.0, "tags": 2.5, "body": 1.0}
+
+# Articles tokenized per batch call while building
+BUILD_BATCH = 512
+
+# Slack below the k-th best score before MaxScore prunes a candidate
+PRUNE_MARGIN = 1e-9
+# Highest-impact postings kept per term, enough to settle a top k from a broad term alone
+TERM_TOP_POSTINGS = 128
+
+# Resolved tag/category filters kept per index
+FILTER_CACHE_SIZE = 256
+
+# A term's contributions memoized across a batch, keyed by term and filter: every posting's
+# in a list, or with a filter only those of filtered documents, by offset into the postings
+SharedImpacts = Dict[Tuple[str, Optional["DocFilter"]], Union[List[float], Dict[int, float]]]
+
+
+class ArticleSink(Protocol):
+    def __len__(self) -> int: ...
+
+    def __getitem__(self, doc_id: int) -> Dict[str, Any]: ...
+
+    def append(self, art: Dict[str, Any]) -> None: ...
+
+
+def article_fields(art: Dict[str, Any]) -> List[str]:
+    return [art.get("title", ""), " ".join(art.get("tags", [])), art.get("body", "")]
+
+
+def article_text(art: Dict[str, Any]) -> str:
+    return " ".join(article_fields(art))
+
+
+def parse_field_boosts(spec: str) -> Dict[str, float]:
+    """Parse `title=3,tags=2.5,body=1`; fields left out keep their default boost."""
+    boosts = dict(DEFAULT_FIELD_BOOSTS)
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, value = part.partition("=")
+        name = name.strip()
+        if name not in FIELDS or not value.strip():
+            raise ValueError(f"Bad field boost {part.strip()!r}, expected one of {', '.join(FIELDS)} as field=weight")
+        boosts[name] = float(value)
+    return boosts
+
+
+def normalize_label(label: str) -> str:
+    return " ".join(label.lower().split())
+
+
+def article_labels(art: Dict[str, Any]) -> Tuple[Set[str], Optional[str]]:
+    """Normalized tags and category of an article, as matched by `DocFilter`."""
+    tags = {normalize_label(t) for t in art.get("tags", []) if isinstance(t, str)}
+    tags.discard("")
+    category = art.get("category")
+    category = normalize_label(category) if isinstance(category, str) else ""
+    return tags, category or None
+
+
+@dataclass(frozen=True)
+class DocFilter:
+    """Restricts a search to articles with any of `tags` and, when given, one of `categories`."""
+
+    tags: Tuple[str, ...] = ()
+    categories: Tuple[str, ...] = ()
+
+    @classmethod
+    def of(
+        cls, tags: Optional[Iterable[str]] = None, categories: Optional[Iterable[str]] = None
+    ) -> Optional["DocFilter"]:
+        """The filter for these labels, or None when there is nothing to filter on."""
+        t = tuple(sorted({normalize_label(x) for x in tags or ()} - {""}))
+        c = tuple(sorted({normalize_label(x) for x in categories or ()} - {""}))
+        return cls(t, c) if t or c else None
+
+    def matches(self, art: Dict[str, Any]) -> bool:
+        tags, category = article_labels(art)
+        if self.tags and tags.isdisjoint(self.tags):
+            return False
+        return not self.categories or category in self.categories
+
+
+def _union(table: Mapping[str, Sequence[int]], keys: Sequence[str]) -> Sequence[int]:
+    if len(keys) == 1:
+        return table.get(keys[0], ())
+    return sorted(set().union(*(table.get(k, ()) for k in keys)))
+
+
+def _positions(docs: Sequence[int], wanted: Sequence[int], wanted_set: Container[int]) -> List[int]:
+    """Offsets into the ascending `docs` of the ids in the ascending `wanted`."""
+    if len(docs) <= 4 * len(wanted):
+        return [j for j, d in enumerate(docs) if d in wanted_set]
+    positions = []
+    lo = 0
+    for d in wanted:
+        lo = bisect_left(docs, d, lo)
+        if lo == len(docs):
+            break
+        if docs[lo] == d:
+            positions.append(lo)
+    return positions
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[Tuple[int, float]]:
+    """Fuse ranked doc id lists by summing 1 / (k + rank) across retrievers."""
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, d in enumerate(ranking, start=1):
+            fused[d] = fused.get(d, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda x: (-x[1], x[0]))
+
+
+class KBIndex:
+    """Inverted index over KB articles, built once at load time.
+
+    `postings` maps a term to the ascending array of doc ids containing it,
+    with the matching term frequencies in `term_freqs`. `field_tfs[field][term]`
+    holds the per-field frequencies aligned with the same postings, and
+    document lengths are kept overall and per field for BM25 and BM25F.
+    `tag_docs` and `category_docs` map each normalized label to the ascending
+    ids of its articles, so a `DocFilter` is resolved before any scoring.
+    Articles are appended to `sink`, a plain list by default or an on-disk
+    store writer.
+    """
+
+    def __init__(
+        self,
+        articles: Iterable[Dict[str, Any]],
+        tokenize: Tokenizer,
+        scorer: str = "bm25",
+        k1: float = 1.2,
+        b: float = 0.75,
+        version: str = "",
+        sink: Optional[ArticleSink] = None,
+        field_boosts: Optional[Dict[str, float]] = None,
+    ) -> None:
+        if scorer not in SCORERS:
+            raise ValueError(f"Unknown scorer: {scorer}")
+        self.field_boosts = dict(DEFAULT_FIELD_BOOSTS if field_boosts is None else field_boosts)
+        if set(self.field_boosts) - set(FIELDS):
+            raise ValueError(f"Field boosts must be for {', '.join(FIELDS)}")
+        self.tokenize = tokenize
+        self.scorer = scorer
+        self.version = version
+        self.k1 = k1
+        self.b = b
+        self.articles: ArticleSink = sink if sink is not None else []
+        self.doc_lengths = array("I")
+        self.total_length = 0
+        self.postings: Dict[str, "array[int]"] = {}
+        self.term_freqs: Dict[str, "array[int]"] = {}
+        self.field_tfs: Dict[str, Dict[str, "array[int]"]] = {f: {} for f in FIELDS}
+        self.field_lengths: Dict[str, "array[int]"] = {f: array("I") for f in FIELDS}
+        self.field_totals: Dict[str, int] = {f: 0 for f in FIELDS}
+        self.tag_docs: Dict[str, "array[int]"] = {}
+        self.category_docs: Dict[str, "array[int]"] = {}
+        self._filters: Dict[DocFilter, Tuple[Sequence[int], Container[int]]] = {}
+        # Per-term MaxScore upper bounds and highest-impact postings, filled lazily
+        # for the statistics queries use, see _impact_order
+        self._bounds: Dict[Tuple[Any, ...], Tuple[float, List[int], float]] = {}
+        # Row-aligned embeddings and their ANN index, attached by Storage when vector retrieval is enabled
+        self.vectors: Optional["VectorIndex"] = None
+        self.ann: Optional["IVFIndex"] = None
+        # Vocabulary trigram index for misspelled query terms, attached by Storage
+        self.fuzzy: Optional["TrigramIndex"] = None
+        batch: List[Dict[str, Any]] = []
+        for art in articles:
+            batch.append(art)
+            if len(batch) >= BUILD_BATCH:
+                self._add_batch(batch)
+                batch = []
+        if batch:
+            self._add_batch(batch)
+
+    def _add_batch(self, batch: List[Dict[str, Any]]) -> None:
+        texts = [text for art in batch for text in article_fields(art)]
+        tokens = tokenize_batch(self.tokenize, texts)
+        n = len(FIELDS)
+        for i, art in enumerate(batch):
+            self._add(art, tokens[i * n : (i + 1) * n])
+
+    def _add(self, art: Dict[str, Any], field_tokens: List[List[str]]) -> None:
+        doc_id = len(self.articles)
+        field_counts = [Counter(tokens) for tokens in field_tokens]
+        counts: Counter = Counter()
+        for c in field_counts:
+            counts.update(c)
+        length = sum(len(tokens) for tokens in field_tokens)
+        self.articles.append(art)
+        self.doc_lengths.append(length)
+        self.total_length += length
+        for field, tokens in zip(FIELDS, field_tokens):
+            self.field_lengths[field].append(len(tokens))
+            self.field_totals[field] += len(tokens)
+        tags, category = article_labels(art)
+        for tag in tags:
+            self.tag_docs.setdefault(tag, array("I")).append(doc_id)
+        if category is not None:
+            self.category_docs.setdefault(category, array("I")).append(doc_id)
+        for term, tf in counts.items():
+            docs = self.postings.get(term)
+            if docs is None:
+                docs = self.postings[term] = array("I")
+                self.term_freqs[term] = array("I")
+                for field in FIELDS:
+                    self.field_tfs[field][term] = array("I")
+            docs.append(doc_id)
+            self.term_freqs[term].append(tf)
+            for field, c in zip(FIELDS, field_counts):
+                self.field_tfs[field][term].append(c.get(term, 0))
+
+    def __len__(self) -> int:
+        return len(self.articles)
+
+    @contextmanager
+    def lease(self) -> Iterator[None]:
+        # Nothing to keep loaded: a local index lives as long as a query references it
+        yield
+
+    @property
+    def avg_length(self) -> float:
+        return self.total_length / len(self.articles) if self.articles else 0.0
+
+    def field_avg_lengths(self) -> Dict[str, float]:
+        n = len(self.articles)
+        return {f: self.field_totals[f] / n if n else 0.0 for f in FIELDS}
+
+    def doc_freqs(self) -> Dict[str, int]:
+        return {term: len(docs) for term, docs in self.postings.items()}
+
+    def idf(self, term: str) -> float:
+        df = len(self.postings.get(term, ()))
+        n = len(self.articles)
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
+
+    def allowed_docs(self, doc_filter: DocFilter) -> Tuple[Sequence[int], Container[int]]:
+        """Ascending ids of the articles passing `doc_filter`, and the same ids as a set."""
+        allowed = self._filters.get(doc_filter)
+        if allowed is None:
+            ids = _union(self.tag_docs, doc_filter.tags) if doc_filter.tags else None
+            if doc_filter.categories:
+                in_category = _union(self.category_docs, doc_filter.categories)
+                ids = in_category if ids is None else sorted(set(ids).intersection(in_category))
+            ids = ids if ids is not None else ()
+            if len(self._filters) >= FILTER_CACHE_SIZE:
+                self._filters.clear()
+            allowed = self._filters[doc_filter] = (ids, frozenset(ids))
+        return allowed
+
+    def _impacts(
+        self,
+        term: str,
+        scorer: str,
+        idf: float,
+        avgdl: float,
+        field_avgdl: Dict[str, float],
+        positions: Optional[Sequence[int]] = None,
+    ) -> List[float]:
+        """Score contributions of `term` at the given offsets into its postings, all by default."""
+        docs = self.postings[term]
+        offsets = range(len(docs)) if positions is None else positions
+        if scorer == "overlap":
+            # Number of distinct query terms each document contains
+            return [1.0] * len(offsets)
+        k1, b = self.k1, self.b
+        out: List[float] = []
+        if scorer == "bm25":
+            tfs, lengths = self.term_freqs[term], self.doc_lengths
+            for i in offsets:
+                tf = tfs[i]
+                norm = k1 * (1.0 - b + b * lengths[docs[i]] / avgdl)
+                out.append(idf * tf * (k1 + 1.0) / (tf + norm))
+            return out
+        # bm25f: per-field frequencies are length-normalized and weighted, then saturated once
+        parts = [
+            (self.field_boosts[f], self.field_tfs[f][term], self.field_lengths[f], field_avgdl[f] or 1.0)
+            for f in FIELDS
+            if self.field_boosts.get(f)
+        ]
+        for i in offsets:
+            d = docs[i]
+            tf = 0.0
+            for boost, ftfs, lengths, favgdl in parts:
+                if ftfs[i]:
+                    tf += boost * ftfs[i] / (1.0 - b + b * lengths[d] / favgdl)
+            out.append(idf * tf * (k1 + 1.0) / (tf + k1))
+        return out
+
+    def _impact_order(
+        self, term: str, scorer: str, avgdl: float, field_avgdl: Dict[str, float]
+    ) -> Tuple[float, List[int], float]:
+        """Per unit of idf: the largest contribution `term` makes to any document,
+        the offsets of its `TERM_TOP_POSTINGS` highest-impact postings, best first
+        and in KB order on ties, and the largest contribution of any other posting."""
+        key = (term, scorer, avgdl, tuple(field_avgdl.values()))
+        order = self._bounds.get(key)
+        if order is None:
+            impacts = self._impacts(term, scorer, 1.0, avgdl, field_avgdl)
+            top = heapq.nsmallest(TERM_TOP_POSTINGS + 1, range(len(impacts)), key=lambda j: (-impacts[j], j))
+            rest = impacts[top.pop()] if len(top) > TERM_TOP_POSTINGS else 0.0
+            order = self._bounds[key] = (impacts[top[0]] if top else 0.0, top, rest)
+        return order
+
+    def _upper_bound(self, term: str, scorer: str, avgdl: float, field_avgdl: Dict[str, float]) -> float:
+        """Largest contribution `term` makes to any document, per unit of idf."""
+        return self._impact_order(term, scorer, avgdl, field_avgdl)[0]
+
+    def _settle_last_term(
+        self,
+        term: str,
+        scores: Dict[int, float],
+        top_k: int,
+        scorer: str,
+        idf: float,
+        avgdl: float,
+        field_avgdl: Dict[str, float],
+        allowed: Optional[Tuple[Sequence[int], Container[int]]],
+    ) -> Optional[Dict[int, float]]:
+        """`scores` plus the last query term, scoring only its highest-impact postings
+        and those of documents already scored, or None if that cannot settle the top k."""
+        docs = self.postings[term]
+        _, top, rest = self._impact_order(term, scorer, avgdl, field_avgdl)
+        if allowed is not None:
+            top = [j for j in top if docs[j] in allowed[1]]
+        seen = _positions(docs, sorted(scores), scores) if scores else []
+        positions = sorted(set(seen).union(top))
+        out = dict(scores)
+        for j, c in zip(positions, self._impacts(term, scorer, idf, avgdl, field_avgdl, positions)):
+            if c:
+                out[docs[j]] = out.get(docs[j], 0.0) + c
+        if rest:
+            if len(out) < top_k:
+                return None
+            kth = heapq.nlargest(top_k, out.values())[-1]
+            # A document left out scores at most idf * rest. With nothing scored before this
+            # term, one that ties comes later in impact order, so later in KB order, and loses
+            limit = kth + PRUNE_MARGIN if not scores else kth - PRUNE_MARGIN
+            if idf * rest > limit:
+                return None
+        return out
+
+    def _plan(
+        self,
+        q_tokens: Set[str],
+        scorer: Optional[str],
+        idfs: Optional[Dict[str, float]],
+        avgdl: Optional[float],
+        field_avgdl: Optional[Dict[str, float]],
+    ) -> Tuple[str, List[str], Dict[str, float], float, Dict[str, float]]:
+        scorer = scorer or self.scorer
+        if scorer not in SCORERS:
+            raise ValueError(f"Unknown scorer: {scorer}")
+        terms = [t for t in q_tokens if t in self.postings]
+        weights = {t: idfs.get(t, 0.0) if idfs is not None else self.idf(t) for t in terms}
+        # Rarest terms first. The order only depends on corpus-wide idf, so shards
+        # add up each document's score in the same order as one index would.
+        terms.sort(key=lambda t: (-weights[t], t))
+        if scorer == "overlap":
+            weights = dict.fromkeys(terms, 1.0)
+        return scorer, terms, weights, avgdl or self.avg_length or 1.0, field_avgdl or self.field_avg_lengths()
+
+    def top_tokens(
+        self,
+        q_tokens: Set[str],
+        top_k: int,
+        scorer: Optional[str] = None,
+        idfs: Optional[Dict[str, float]] = None,
+        avgdl: Optional[float] = None,
+        field_avgdl: Optional[Dict[str, float]] = None,
+        shared: Optional[SharedImpacts] = None,
+        doc_filter: Optional[DocFilter] = None,
+        stages: Optional[Dict[str, float]] = None,
+    ) -> List[Tuple[int, float]]:
+        """The `top_k` (doc id, score) pairs for the already tokenized query terms,
+        with MaxScore pruning.
+
+        `idfs`, `avgdl` and `field_avgdl` override this index's own statistics,
+        which lets a shard score with corpus-wide values and rank exactly like
+        one index. Terms are scored one at a time, rarest first. Once the k-th best partial
+        score reaches the summed upper bounds of the terms left, no unseen
+        document can enter the top k: the remaining, typically broad, terms are
+        only looked up for the surviving candidates, and candidates that can no
+        longer reach the k-th score are dropped. If the last term is reached
+        while still growing, as for a single broad term, its highest-impact
+        postings alone often settle the top k and the rest are skipped.
+
+        `shared` memoizes each term's contributions across the queries of a
+        batch, so a term's postings are scored once however many queries use it,
+        with or without a filter. With `doc_filter`, postings are intersected with the filter's doc ids
+        before anything is scored.
+
+        `stages` accumulates ms per stage. MaxScore finds candidates while
+        scoring, so "candidates" is the planning before it: term lookup,
+        filter resolution and upper bounds.
+        """
+        start = time.perf_counter()
+        scorer, terms, weights, avgdl, field_avgdl = self._plan(q_tokens, scorer, idfs, avgdl, field_avgdl)
+        allowed = self.allowed_docs(doc_filter) if doc_filter is not None else None
+        if allowed is not None and not allowed[0]:
+            terms = []
+        top_k = max(1, top_k)
+        bounds = [weights[t] * self._upper_bound(t, scorer, avgdl, field_avgdl) for t in terms]
+        start = record_stage(stages, "candidates", start)
+        scores: Dict[int, float] = {}
+        growing = True
+        for i, term in enumerate(terms):
+            docs = self.postings[term]
+            key = (term, doc_filter)
+            memo = shared.get(key) if shared is not None else None
+            if growing and memo is None and i == len(terms) - 1:
+                settled = self._settle_last_term(
+                    term, scores, top_k, scorer, weights[term], avgdl, field_avgdl, allowed
+                )
+                if settled is not None:
+                    scores = settled
+                    break
+            if growing and allowed is None:
+                impacts = memo if memo is not None else self._impacts(term, scorer, weights[term], avgdl, field_avgdl)
+                if shared is not None:
+                    shared[key] = impacts
+                for d, c in zip(docs, impacts):
+                    if c:
+                        scores[d] = scores.get(d, 0.0) + c
+            elif growing or scores:
+                # Only postings of filtered documents, or of surviving candidates once pruning, are scored
+                wanted, wanted_set = allowed if growing and allowed is not None else (sorted(scores), scores)
+                positions = _positions(docs, wanted, wanted_set)
+                if memo is not None:
+                    impacts = [memo[j] for j in positions]
+                else:
+                    impacts = self._impacts(term, scorer, weights[term], avgdl, field_avgdl, positions)
+                    if growing and shared is not None:
+                        # Every filtered posting was scored, the batch's next queries reuse them
+                        shared[key] = dict(zip(positions, impacts))
+                for j, c in zip(positions, impacts):
+                    if c:
+                        scores[docs[j]] = scores.get(docs[j], 0.0) + c
+            if len(scores) < top_k:
+                continue
+            rest = sum(bounds[i + 1 :])
+            # The margin keeps float rounding from pruning a document that ties the k-th score
+            threshold = heapq.nlargest(top_k, scores.values())[-1] - PRUNE_MARGIN
+            if growing and rest <= threshold:
+                growing = False
+            if not growing:
+                scores = {d: s for d, s in scores.items() if s + rest > threshold}
+        start = record_stage(stages, "scoring", start)
+        # Ties keep KB order, matching the original linear scan.
+        top = heapq.nsmallest(top_k, scores.items(), key=lambda x: (-x[1], x[0]))
+        record_stage(stages, "sort", start)
+        return top
+
+    def explain_tokens(
+        self,
+        q_tokens: Set[str],
+        doc_ids: Sequence[int],
+        scorer: Optional[str] = None,
+        idfs: Optional[Dict[str, float]] = None,
+        avgdl: Optional[float] = None,
+        field_avgdl: Optional[Dict[str, float]] = None,
+    ) -> Dict[int, Dict[str, Any]]:
+        """Per-term and per-field score breakdown of `doc_ids` for the tokenized query.
+
+        A term's score is split across fields in proportion to what each field
+        adds to its saturated frequency: weighted, length-normalized frequency
+        for bm25f, raw frequency for bm25 and overlap.
+        """
+        scorer, terms, weights, avgdl, field_avgdl = self._plan(q_tokens, scorer, idfs, avgdl, field_avgdl)
+        b = self.b
+        out: Dict[int, Dict[str, Any]] = {d: {"score": 0.0, "terms": []} for d in doc_ids}
+        for term in terms:
+            docs = self.postings[term]
+            for d in doc_ids:
+                j = bisect_left(docs, d)
+                if j == len(docs) or docs[j] != d:
+                    continue
+                score = self._impacts(term, scorer, weights[term], avgdl, field_avgdl, [j])[0]
+                tfs = {f: self.field_tfs[f][term][j] for f in FIELDS}
+                shares: Dict[str, float] = {}
+                for f, tf in tfs.items():
+                    if scorer == "bm25f":
+                        norm = 1.0 - b + b * self.field_lengths[f][d] / (field_avgdl[f] or 1.0)
+                        shares[f] = self.field_boosts.get(f, 0.0) * tf / norm
+                    else:
+                        shares[f] = float(tf)
+                total = sum(shares.values()) or 1.0
+                fields = {f: {"tf": tf, "score": score * shares[f] / total} for f, tf in tfs.items() if tf}
+                entry = out[d]
+                tf = self.term_freqs[term][j]
+                entry["terms"].append({"term": term, "weight": weights[term], "tf": tf, "score": score, "fields": fields})
+                entry["score"] += score
+        return out
+
+    def query_terms(self, query: str) -> Set[str]:
+        tokens = self.tokenize(query)
+        return self.fuzzy.expand(tokens) if self.fuzzy is not None else set(tokens)
+
+    def rank(
+        self,
+        query: str,
+        top_k: int = 3,
+        scorer: Optional[str] = None,
+        doc_filter: Optional[DocFilter] = None,
+        stages: Optional[Dict[str, float]] = None,
+    ) -> List[Tuple[int, float]]:
+        start = time.perf_counter()
+        q_tokens = self.query_terms(query)
+        record_stage(stages, "tokenize", start)
+        return self.top_tokens(q_tokens, top_k, scorer, doc_filter=doc_filter, stages=stages)
+
+    def explain(
+        self, query: str, doc_ids: Sequence[int], scorer: Optional[str] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        return self.explain_tokens(self.query_terms(query), doc_ids, scorer)
+
+    def top_tokens_batch(
+        self,
+        queries: Sequence[Set[str]],
+        top_k: int,
+        scorer: Optional[str] = None,
+        idfs: Optional[Dict[str, float]] = None,
+        avgdl: Optional[float] = None,
+        field_avgdl: Optional[Dict[str, float]] = None,
+        doc_filter: Optional[DocFilter] = None,
+    ) -> List[Tuple[List[Tuple[int, float]], float]]:
+        """`top_tokens` for each query, sharing term contributions; pairs each result with its time in ms."""
+        shared: SharedImpacts = {}
+        out = []
+        for q_tokens in queries:
+            start = time.perf_counter()
+            top = self.top_tokens(q_tokens, top_k, scorer, idfs, avgdl, field_avgdl, shared, doc_filter)
+            out.append((top, (time.perf_counter() - start) * 1000.0))
+        return out
+
+    def rank_batch(
+        self,
+        queries: Sequence[str],
+        top_k: int = 3,
+        scorer: Optional[str] = None,
+        doc_filter: Optional[DocFilter] = None,
+    ) -> List[Tuple[List[Tuple[int, float]], float]]:
+        return self.top_tokens_batch([self.query_terms(q) for q in queries], top_k, scorer, doc_filter=doc_filter)
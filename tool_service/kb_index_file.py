@@ -0,0 +1,356 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+from .kb_fuzzy import TrigramIndex, trigrams
+from .kb_index import FIELDS, KBIndex, Tokenizer, article_text
+from .kb_loader import KBFileReader
+from .kb_store import ArticleStore, ArticleStoreWriter
+from .kb_vectors import HashingEmbedder, VectorIndex
+from .tokenizer import TOKENIZERS, get_tokenizer
+
+
+MAGIC = b"KBINDEX\0"
+FORMAT_VERSION = 2
+# magic, format version, crc32 of the header, header offset, header length
+_PREFIX = struct.Struct("<8sIIQQ")
+_ALIGN = 8
+
+
+class _Keys(Sequence[str]):
+    def __init__(self, table: "MappedTable") -> None:
+        self._table = table
+
+    def __len__(self) -> int:
+        return len(self._table)
+
+    def __getitem__(self, i: Any) -> Any:
+        return self._table.key_at(i)
+
+
+class _Lengths(Sequence[int]):
+    def __init__(self, offsets: Sequence[int]) -> None:
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: Any) -> Any:
+        return self._offsets[i + 1] - self._offsets[i]
+
+
+class MappedTable(Mapping[str, Sequence[int]]):
+    """Sorted string keys, each mapped to a slice of one uint32 array.
+
+    Everything is a view into the mapped index file and lookups binary-search
+    the keys, so opening a table costs the same however many keys it holds.
+    """
+
+    def __init__(
+        self, blob: memoryview, key_offsets: Sequence[int], value_offsets: Sequence[int], values: Sequence[int]
+    ) -> None:
+        self._blob = blob
+        self._key_offsets = key_offsets
+        self._value_offsets = value_offsets
+        self._values = values
+
+    def __len__(self) -> int:
+        return len(self._key_offsets) - 1
+
+    def _key_bytes(self, i: int) -> bytes:
+        return bytes(self._blob[self._key_offsets[i] : self._key_offsets[i + 1]])
+
+    def key_at(self, i: int) -> str:
+        return self._key_bytes(i).decode("utf-8")
+
+    def _find(self, key: str) -> int:
+        target = key.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_bytes(mid) < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self) and self._key_bytes(lo) == target else -1
+
+    def __getitem__(self, key: str) -> Sequence[int]:
+        i = self._find(key) if isinstance(key, str) else -1
+        if i < 0:
+            raise KeyError(key)
+        return self._values[self._value_offsets[i] : self._value_offsets[i + 1]]
+
+    def __contains__(self, key: object) -> bool:
+        return isinstance(key, str) and self._find(key) >= 0
+
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self.key_at(i)
+
+    def keys_seq(self) -> Sequence[str]:
+        """Keys by position, the term ids of the trigram table."""
+        return _Keys(self)
+
+    def value_lengths(self) -> Sequence[int]:
+        return _Lengths(self._value_offsets)
+
+    def with_values(self, values: Sequence[int]) -> "MappedTable":
+        """Same keys and offsets over another value array aligned with this one."""
+        return MappedTable(self._blob, self._key_offsets, self._value_offsets, values)
+
+
+class _SectionWriter:
+    """Append 8-byte aligned sections to a file, hashing everything written."""
+
+    def __init__(self, f: BinaryIO) -> None:
+        self.f = f
+        self.sha = hashlib.sha256()
+        self.sections: Dict[str, List[Any]] = {}
+        f.write(b"\0" * _PREFIX.size)
+        self.pos = _PREFIX.size
+
+    def _raw(self, data: Any) -> None:
+        self.f.write(data)
+        self.sha.update(data)
+        self.pos += len(data)
+
+    def write(self, name: str, chunks: Iterable[Any], typecode: str = "B") -> int:
+        pad = -self.pos % _ALIGN
+        if pad:
+            self._raw(b"\0" * pad)
+        start = self.pos
+        for chunk in chunks:
+            self._raw(memoryview(chunk).cast("B"))
+        self.sections[name] = [start, self.pos - start, typecode]
+        return start
+
+    def write_table(self, name: str, keys: List[str], values: Dict[str, Iterable["array[int]"]]) -> None:
+        """`values` maps a section name suffix to per-key arrays, in key order."""
+        encoded = [k.encode("utf-8") for k in keys]
+        key_offsets = array("q", [0])
+        for k in encoded:
+            key_offsets.append(key_offsets[-1] + len(k))
+        self.write(f"{name}.keys", [b"".join(encoded)])
+        self.write(f"{name}.key_offsets", [key_offsets], "q")
+        value_offsets: Optional["array[int]"] = None
+        for suffix, arrays in values.items():
+            flat = array("I")
+            offsets = array("q", [0])
+            for a in arrays:
+                flat.extend(a)
+                offsets.append(len(flat))
+            if value_offsets is None:
+                value_offsets = offsets
+                self.write(f"{name}.value_offsets", [value_offsets], "q")
+            self.write(f"{name}.{suffix}", [flat], "I")
+
+
+def _file_chunks(path: str, chunk_size: int = 1 << 20) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        yield from iter(lambda: f.read(chunk_size), b"")
+
+
+def build_index_file(
+    kb_path: str, out_path: str, tokenizer: str = "simple", vectors: bool = False
+) -> Dict[str, Any]:
+    """Index the KB file and write it, articles included, to `out_path` atomically."""
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    reader = KBFileReader(kb_path)
+    writer = ArticleStoreWriter(out_dir)
+    try:
+        index = KBIndex(reader, get_tokenizer(tokenizer), sink=writer)
+    except BaseException:
+        writer.abort()
+        raise
+    store_tmp = f"{out_path}.store.{os.getpid()}.tmp"
+    store = writer.finish(store_tmp)
+    fd, tmp = tempfile.mkstemp(dir=out_dir, prefix="kb_index.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            w = _SectionWriter(f)
+            terms = sorted(index.postings)
+            columns = {"postings": index.postings, "tfs": index.term_freqs}
+            for field in FIELDS:
+                columns[f"tfs.{field}"] = index.field_tfs[field]
+            w.write_table("terms", terms, {name: map(col.__getitem__, terms) for name, col in columns.items()})
+            w.write("doc_lengths", [index.doc_lengths], "I")
+            for field in FIELDS:
+                w.write(f"lengths.{field}", [index.field_lengths[field]], "I")
+
+            # Trigram ids are positions in the sorted vocabulary
+            grams: Dict[str, "array[int]"] = {}
+            for term_id, term in enumerate(terms):
+                for gram in trigrams(term):
+                    ids = grams.get(gram)
+                    if ids is None:
+                        ids = grams[gram] = array("I")
+                    ids.append(term_id)
+            gram_keys = sorted(grams)
+            w.write_table("grams", gram_keys, {"terms": (grams[g] for g in gram_keys)})
+            for name, labels in (("tags", index.tag_docs), ("categories", index.category_docs)):
+                label_keys = sorted(labels)
+                w.write_table(name, label_keys, {"docs": (labels[k] for k in label_keys)})
+
+            base = w.write("store", _file_chunks(store_tmp))
+            w.write("store.offsets", [array("q", (base + o for o in store.offsets))], "q")
+            w.write("store.lengths", [store.lengths], "q")
+
+            vector_dim = None
+            if vectors:
+                embedder = HashingEmbedder()
+                matrix = VectorIndex.build((article_text(a) for a in store), embedder).matrix
+                w.write("vectors", [np.ascontiguousarray(matrix, dtype=np.float32)], "f")
+                vector_dim = embedder.dim
+
+            header = {
+                "format": FORMAT_VERSION,
+                "kb_version": reader.version or "",
+                "kb_path": os.path.abspath(kb_path),
+                "built_at": time.time(),
+                "tokenizer": tokenizer,
+                "byteorder": sys.byteorder,
+                "docs": len(index),
+                "total_length": index.total_length,
+                "field_totals": index.field_totals,
+                "vector_dim": vector_dim,
+                "sha256": w.sha.hexdigest(),
+                "sections": w.sections,
+            }
+            data = json.dumps(header, sort_keys=True).encode("utf-8")
+            header_offset = w.pos
+            f.write(data)
+            f.seek(0)
+            f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, zlib.crc32(data), header_offset, len(data)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, out_path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    finally:
+        del store
+        os.remove(store_tmp)
+    return header
+
+
+class IndexFile:
+    """A KB index written by `build_index_file`, memory-mapped read-only.
+
+    Opening only reads and checks the small header, so it takes the same
+    time whatever the KB size; postings, vocabulary, articles and vectors are
+    paged in by the OS as queries touch them. `verify` re-hashes the whole
+    file against the checksum in the header.
+    """
+
+    def __init__(self, path: str, verify: bool = False) -> None:
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mm) < _PREFIX.size:
+            raise ValueError(f"{path} is not a KB index file")
+        magic, fmt, crc, header_offset, header_len = _PREFIX.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a KB index file")
+        if fmt != FORMAT_VERSION:
+            raise ValueError(f"{path} has index format {fmt}, expected {FORMAT_VERSION}; rebuild it")
+        data = self._mm[header_offset : header_offset + header_len]
+        if len(data) != header_len or zlib.crc32(data) != crc:
+            raise ValueError(f"{path} has a corrupt header")
+        self.header: Dict[str, Any] = json.loads(data)
+        if self.header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path} was built on a {self.header['byteorder']}-endian machine")
+        for name, (start, size, _) in self.header["sections"].items():
+            if start + size > header_offset:
+                raise ValueError(f"{path} section {name} is out of bounds")
+        if verify and hashlib.sha256(self._mm[_PREFIX.size : header_offset]).hexdigest() != self.header["sha256"]:
+            raise ValueError(f"{path} does not match its checksum")
+        self._view = memoryview(self._mm)
+
+    @property
+    def version(self) -> str:
+        return self.header["kb_version"]
+
+    @property
+    def tokenizer(self) -> str:
+        return self.header["tokenizer"]
+
+    def _section(self, name: str) -> memoryview:
+        start, size, typecode = self.header["sections"][name]
+        return self._view[start : start + size].cast(typecode)
+
+    def _table(self, name: str, values: str) -> MappedTable:
+        return MappedTable(
+            self._section(f"{name}.keys"),
+            self._section(f"{name}.key_offsets"),
+            self._section(f"{name}.value_offsets"),
+            self._section(f"{name}.{values}"),
+        )
+
+    def kb_index(
+        self,
+        tokenize: Tokenizer,
+        scorer: str = "bm25",
+        field_boosts: Optional[Dict[str, float]] = None,
+    ) -> KBIndex:
+        articles = ArticleStore(self.path, self._section("store.offsets"), self._section("store.lengths"))
+        index = KBIndex((), tokenize, scorer=scorer, version=self.version, sink=articles, field_boosts=field_boosts)
+        postings = self._table("terms", "postings")
+        index.postings = postings
+        index.term_freqs = postings.with_values(self._section("terms.tfs"))
+        index.doc_lengths = self._section("doc_lengths")
+        index.total_length = self.header["total_length"]
+        for field in FIELDS:
+            index.field_tfs[field] = postings.with_values(self._section(f"terms.tfs.{field}"))
+            index.field_lengths[field] = self._section(f"lengths.{field}")
+            index.field_totals[field] = self.header["field_totals"][field]
+        index.tag_docs = self._table("tags", "docs")
+        index.category_docs = self._table("categories", "docs")
+        return index
+
+    def trigram_index(self) -> TrigramIndex:
+        terms = self._table("terms", "postings")
+        return TrigramIndex(terms.keys_seq(), terms.value_lengths(), self._table("grams", "terms"), terms)
+
+    def vectors(self) -> Optional[np.ndarray]:
+        dim = self.header.get("vector_dim")
+        if not dim:
+            return None
+        start, size, _ = self.header["sections"]["vectors"]
+        return np.frombuffer(self._mm, dtype=np.float32, count=size // 4, offset=start).reshape(-1, dim)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the binary KB index file the tool service maps at startup.")
+    parser.add_argument("--kb", default=os.path.join(os.path.dirname(__file__), "data", "kb_articles.json"))
+    parser.add_argument(
+        "--out", default=os.path.join(os.path.dirname(__file__), "..", "runtime", "index", "kb_index.bin")
+    )
+    parser.add_argument("--tokenizer", default=os.getenv("KB_TOKENIZER", "simple"), choices=sorted(TOKENIZERS))
+    parser.add_argument("--vectors", action="store_true", help="also store hashed n-gram embeddings")
+    parser.add_argument("--verify", action="store_true", help="check an existing --out file against its checksum")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.verify:
+        header = IndexFile(args.out, verify=True).header
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        header = build_index_file(args.kb, args.out, tokenizer=args.tokenizer, vectors=args.vectors)
+    print(json.dumps({"path": args.out, "version": header["kb_version"], "docs": header["docs"],
+                      "bytes": os.path.getsize(args.out), "seconds": round(time.perf_counter() - t0, 2)}))
+
+
+if __name__ == "__main__":
+    main()
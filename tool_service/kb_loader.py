@@ -0,0 +1,136 @@
+import codecs
+import hashlib
+import json
+from typing import Any, Dict, Iterator, Optional
+
+
+JSONL_SUFFIXES = (".jsonl", ".ndjson")
+_WS = " \t\r\n"
+
+
+def _iter_json_array(chunks: Iterator[str]) -> Iterator[Dict[str, Any]]:
+    """Yield the objects of a top-level JSON array without holding the whole text.
+
+    Only the current chunk and the article being decoded are buffered, so peak
+    memory is bounded by the largest single article, not by the file size.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+    state = "start"
+
+    def fill() -> None:
+        nonlocal buf, pos, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+        else:
+            buf = buf[pos:] + chunk
+            pos = 0
+
+    while True:
+        while True:
+            while pos < len(buf) and buf[pos] in _WS:
+                pos += 1
+            if pos < len(buf) or eof:
+                break
+            fill()
+        if pos >= len(buf):
+            raise ValueError("Unexpected end of KB JSON")
+        ch = buf[pos]
+        if state == "start":
+            if ch != "[":
+                raise ValueError("KB JSON must be an array of articles")
+            pos += 1
+            state = "first"
+            continue
+        if ch == "]" and state in ("first", "sep"):
+            # Like json.load, only whitespace may follow; KBFileReader checks the chunks after this one
+            if buf[pos + 1 :].strip(_WS):
+                raise ValueError("Unexpected data after the KB JSON array")
+            return
+        if state == "sep":
+            if ch != ",":
+                raise ValueError(f"Expected ',' between KB articles, got {ch!r}")
+            pos += 1
+            state = "item"
+            continue
+        while True:
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+                break
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+        if not isinstance(obj, dict):
+            raise ValueError("KB articles must be JSON objects")
+        yield obj
+        pos = end
+        state = "sep"
+
+
+class KBFileReader:
+    """Stream articles from a KB file, JSON array or JSONL by extension.
+
+    The content hash is computed over the same bytes as they are parsed, and
+    `version` is set once iteration completes.
+    """
+
+    def __init__(self, path: str, chunk_size: int = 1 << 20) -> None:
+        self.path = path
+        self.chunk_size = chunk_size
+        self.version: Optional[str] = None
+        self.count = 0
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        h = hashlib.sha256()
+        self.count = 0
+        with open(self.path, "rb") as f:
+            chunks = self._iter_chunks(f, h)
+            if self.path.lower().endswith(JSONL_SUFFIXES):
+                articles = self._iter_jsonl(f, h)
+            else:
+                articles = _iter_json_array(chunks)
+            for art in articles:
+                self.count += 1
+                yield art
+            # Hash whatever follows the closing bracket so the version covers the whole file
+            for rest in chunks:
+                if rest.strip(_WS):
+                    raise ValueError("Unexpected data after the KB JSON array")
+        self.version = h.hexdigest()[:16]
+
+    def _iter_chunks(self, f: Any, h: Any) -> Iterator[str]:
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        while True:
+            raw = f.read(self.chunk_size)
+            if not raw:
+                tail = decoder.decode(b"", final=True)
+                if tail:
+                    yield tail
+                return
+            h.update(raw)
+            yield decoder.decode(raw)
+
+    @staticmethod
+    def _iter_jsonl(f: Any, h: Any) -> Iterator[Dict[str, Any]]:
+        for lineno, raw in enumerate(f, start=1):
+            h.update(raw)
+            line = raw.decode("utf-8").strip()
+            if not line:
+                continue
+            obj = json.loads(line)
+            if not isinstance(obj, dict):
+                raise ValueError(f"KB line {lineno} is not a JSON object")
+            yield obj
+
+
+def file_version(path: str, chunk_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()[:16]
+
@@ -0,0 +1,463 @@
+import heapq
+import itertools
+import logging
+import math
+import multiprocessing as mp
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Hashable, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .kb_index import FIELDS, ArticleSink, DocFilter, KBIndex, Tokenizer
+from .kb_loader import KBFileReader
+from .kb_timings import record_stage
+from .tokenizer import get_tokenizer
+
+if TYPE_CHECKING:
+    from .kb_fuzzy import TrigramIndex
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds to wait for every shard to answer a query or finish loading a KB
+QUERY_TIMEOUT = 30.0
+LOAD_TIMEOUT = 3600.0
+# Seconds between checks that every shard worker is still alive while waiting
+LIVENESS_INTERVAL = 0.5
+
+
+class GenerationRetired(RuntimeError):
+    """The KB generation was retired by a reload; retrying against the current one succeeds."""
+
+
+def _generation(indexes: Dict[int, KBIndex], gen: int) -> KBIndex:
+    index = indexes.get(gen)
+    if index is None:
+        raise GenerationRetired(f"KB generation {gen} is no longer loaded")
+    return index
+
+
+class _CountingSink:
+    """Shards only score; the coordinator owns the articles."""
+
+    def __init__(self) -> None:
+        self.n = 0
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __getitem__(self, doc_id: int) -> Dict[str, Any]:
+        raise IndexError("Shard workers do not keep articles")
+
+    def append(self, art: Dict[str, Any]) -> None:
+        self.n += 1
+
+
+def _load_shard(
+    shard_id: int, num_shards: int, gen: int, kb_path: str, tokenizer: str, scorer: str,
+    field_boosts: Dict[str, float], indexes: Dict[int, KBIndex], outbox: Any,
+) -> None:
+    try:
+        reader = KBFileReader(kb_path)
+        # Doc ids interleave across shards: global id = local id * num_shards + shard id
+        articles = (a for i, a in enumerate(reader) if i % num_shards == shard_id)
+        index = KBIndex(
+            articles, get_tokenizer(tokenizer), scorer=scorer, sink=_CountingSink(), field_boosts=field_boosts
+        )
+        indexes[gen] = index
+        stats = {
+            "version": reader.version,
+            "docs": len(index),
+            "total_length": index.total_length,
+            "field_totals": index.field_totals,
+            "df": {term: len(docs) for term, docs in index.postings.items()},
+        }
+        outbox.put((("load", gen), shard_id, stats))
+    except Exception as e:
+        outbox.put((("load", gen), shard_id, e))
+
+
+def _shard_main(shard_id: int, num_shards: int, inbox: Any, outbox: Any) -> None:
+    indexes: Dict[int, KBIndex] = {}
+    while True:
+        msg = inbox.get()
+        if msg is None:
+            return
+        op = msg[0]
+        if op == "load":
+            # Built on a thread so queries against the current generation keep being answered
+            args = (shard_id, num_shards, *msg[1:], indexes, outbox)
+            threading.Thread(target=_load_shard, args=args, daemon=True).start()
+        elif op == "drop":
+            indexes.pop(msg[1], None)
+        elif op == "rank":
+            _, req_id, gen, q_tokens, scorer, idfs, avgdl, field_avgdl, top_k, doc_filter = msg
+            try:
+                stages: Dict[str, float] = {}
+                top = _generation(indexes, gen).top_tokens(
+                    set(q_tokens), top_k, scorer, idfs, avgdl, field_avgdl, doc_filter=doc_filter, stages=stages
+                )
+                outbox.put((req_id, shard_id, ([(d * num_shards + shard_id, s) for d, s in top], stages)))
+            except Exception as e:
+                outbox.put((req_id, shard_id, e))
+        elif op == "explain":
+            _, req_id, gen, q_tokens, scorer, idfs, avgdl, field_avgdl, doc_ids = msg
+            try:
+                # Each shard explains the documents it holds
+                local = [d // num_shards for d in doc_ids if d % num_shards == shard_id]
+                explained = _generation(indexes, gen).explain_tokens(set(q_tokens), local, scorer, idfs, avgdl, field_avgdl)
+                outbox.put((req_id, shard_id, {d * num_shards + shard_id: e for d, e in explained.items()}))
+            except Exception as e:
+                outbox.put((req_id, shard_id, e))
+        elif op == "rank_batch":
+            _, req_id, gen, queries, scorer, idfs, avgdl, field_avgdl, top_k, doc_filter = msg
+            try:
+                batch = _generation(indexes, gen).top_tokens_batch(
+                    [set(q) for q in queries], top_k, scorer, idfs, avgdl, field_avgdl, doc_filter
+                )
+                out = [([(d * num_shards + shard_id, s) for d, s in top], ms) for top, ms in batch]
+                outbox.put((req_id, shard_id, out))
+            except Exception as e:
+                outbox.put((req_id, shard_id, e))
+
+
+class _Gather:
+    def __init__(self, n: int) -> None:
+        self.parts: List[Any] = [None] * n
+        self.remaining = n
+        self.done = threading.Event()
+
+    def wait(self, timeout: float, procs: Sequence[Any] = ()) -> List[Any]:
+        deadline = time.monotonic() + timeout
+        # A worker that died never answers, so fail as soon as one is gone instead of at the deadline
+        while not self.done.wait(min(LIVENESS_INTERVAL, max(0.0, deadline - time.monotonic()))):
+            dead = [p.name for p in procs if not p.is_alive()]
+            if dead:
+                raise RuntimeError(f"KB shard workers exited: {', '.join(dead)}")
+            if time.monotonic() >= deadline:
+                raise TimeoutError("KB shards did not answer in time")
+        for part in self.parts:
+            if isinstance(part, BaseException):
+                raise part
+        return self.parts
+
+
+def _receive(outbox: Any, pending: Dict[Hashable, _Gather], lock: threading.Lock) -> None:
+    while True:
+        msg = outbox.get()
+        if msg is None:
+            return
+        key, shard_id, payload = msg
+        with lock:
+            gather = pending.get(key)
+            if gather is None:
+                continue
+            gather.parts[shard_id] = payload
+            gather.remaining -= 1
+            if gather.remaining == 0:
+                del pending[key]
+                gather.done.set()
+
+
+def _merge(parts: List[List[Tuple[int, float]]], top_k: int) -> List[Tuple[int, float]]:
+    # Each shard's list is already its own top_k; a heap merge picks the global one
+    return heapq.nsmallest(top_k, itertools.chain.from_iterable(parts), key=lambda x: (-x[1], x[0]))
+
+
+def fork_available() -> bool:
+    # spawn would re-import `tool_service.app` in every worker, which builds its own
+    # Storage and ShardPool while still bootstrapping, so sharding needs fork
+    return "fork" in mp.get_all_start_methods()
+
+
+def _mp_context() -> Any:
+    # Workers are started once, before any server threads exist; reloads reuse them
+    if not fork_available():
+        raise RuntimeError("KB shards need the fork start method, which this platform lacks")
+    return mp.get_context("fork")
+
+
+class ShardPool:
+    """Long-lived shard worker processes plus the scatter/gather plumbing.
+
+    Each worker holds one KBIndex per loaded generation over every
+    `num_shards`-th article, so scoring runs on all cores in parallel. If a
+    worker dies, waiting requests fail at once rather than at their timeout.
+    """
+
+    def __init__(self, num_shards: int) -> None:
+        ctx = _mp_context()
+        self.num_shards = num_shards
+        self._outbox = ctx.Queue()
+        self._inboxes = [ctx.Queue() for _ in range(num_shards)]
+        self._procs = [
+            ctx.Process(target=_shard_main, args=(i, num_shards, inbox, self._outbox), name=f"kb-shard-{i}", daemon=True)
+            for i, inbox in enumerate(self._inboxes)
+        ]
+        for p in self._procs:
+            p.start()
+        self._lock = threading.Lock()
+        self._pending: Dict[Hashable, _Gather] = {}
+        self._req_ids = itertools.count()
+        self._gens = itertools.count(1)
+        self._receiver = threading.Thread(
+            target=_receive, args=(self._outbox, self._pending, self._lock), name="kb-shard-receiver", daemon=True
+        )
+        self._receiver.start()
+
+    def _scatter(self, key: Hashable, msg: Tuple[Any, ...]) -> _Gather:
+        gather = _Gather(self.num_shards)
+        with self._lock:
+            self._pending[key] = gather
+        for inbox in self._inboxes:
+            inbox.put(msg)
+        return gather
+
+    def _wait(self, key: Hashable, gather: _Gather, timeout: float) -> List[Any]:
+        try:
+            return gather.wait(timeout, self._procs)
+        finally:
+            # Unanswered requests must not linger; late answers are then ignored by _receive
+            with self._lock:
+                if self._pending.get(key) is gather:
+                    del self._pending[key]
+
+    def start_load(
+        self, kb_path: str, tokenizer: str, scorer: str, field_boosts: Dict[str, float]
+    ) -> Tuple[int, _Gather]:
+        gen = next(self._gens)
+        return gen, self._scatter(("load", gen), ("load", gen, kb_path, tokenizer, scorer, field_boosts))
+
+    def finish_load(self, gen: int, gather: _Gather) -> List[Dict[str, Any]]:
+        try:
+            return self._wait(("load", gen), gather, LOAD_TIMEOUT)
+        except BaseException:
+            self.drop(gen)
+            raise
+
+    def rank(
+        self,
+        gen: int,
+        q_tokens: Sequence[str],
+        scorer: str,
+        idfs: Dict[str, float],
+        avgdl: float,
+        field_avgdl: Dict[str, float],
+        top_k: int,
+        doc_filter: Optional[DocFilter] = None,
+        stages: Optional[Dict[str, float]] = None,
+    ) -> List[Tuple[int, float]]:
+        """Scatter one query and merge the shards' top k. Shards run their stages
+        in parallel, so `stages` gets the slowest shard's time for each."""
+        req_id = next(self._req_ids)
+        msg = ("rank", req_id, gen, list(q_tokens), scorer, idfs, avgdl, field_avgdl, top_k, doc_filter)
+        parts = self._wait(req_id, self._scatter(req_id, msg), QUERY_TIMEOUT)
+        if stages is not None:
+            for _, shard_stages in parts:
+                for name, ms in shard_stages.items():
+                    stages[name] = max(stages.get(name, 0.0), ms)
+        start = time.perf_counter()
+        top = _merge([top for top, _ in parts], top_k)
+        record_stage(stages, "sort", start)
+        return top
+
+    def explain(
+        self,
+        gen: int,
+        q_tokens: Sequence[str],
+        scorer: str,
+        idfs: Dict[str, float],
+        avgdl: float,
+        field_avgdl: Dict[str, float],
+        doc_ids: Sequence[int],
+    ) -> Dict[int, Dict[str, Any]]:
+        req_id = next(self._req_ids)
+        msg = ("explain", req_id, gen, list(q_tokens), scorer, idfs, avgdl, field_avgdl, list(doc_ids))
+        out: Dict[int, Dict[str, Any]] = {}
+        for part in self._wait(req_id, self._scatter(req_id, msg), QUERY_TIMEOUT):
+            out.update(part)
+        return out
+
+    def rank_batch(
+        self,
+        gen: int,
+        queries: Sequence[Sequence[str]],
+        scorer: str,
+        idfs: Dict[str, float],
+        avgdl: float,
+        field_avgdl: Dict[str, float],
+        top_k: int,
+        doc_filter: Optional[DocFilter] = None,
+    ) -> List[Tuple[List[Tuple[int, float]], float]]:
+        """Rank many queries in one round trip; each result comes with the slowest shard's time in ms."""
+        req_id = next(self._req_ids)
+        queries = [list(q) for q in queries]
+        msg = ("rank_batch", req_id, gen, queries, scorer, idfs, avgdl, field_avgdl, top_k, doc_filter)
+        parts = self._wait(req_id, self._scatter(req_id, msg), QUERY_TIMEOUT)
+        return [
+            (_merge([top for top, _ in per_shard], top_k), max(ms for _, ms in per_shard))
+            for per_shard in zip(*parts)
+        ]
+
+    def drop(self, gen: int) -> None:
+        for inbox in self._inboxes:
+            inbox.put(("drop", gen))
+
+    def close(self) -> None:
+        for inbox in self._inboxes:
+            inbox.put(None)
+        for p in self._procs:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        self._outbox.put(None)
+        self._receiver.join(timeout=5)
+
+
+class ShardedKB:
+    """One KB generation served by a ShardPool, with the KBIndex search interface.
+
+    Corpus-wide document frequencies and average length are merged from the
+    shards at load time and sent with each query, so BM25 scores and ties are
+    identical to a single KBIndex over the same file.
+    """
+
+    def __init__(
+        self,
+        pool: ShardPool,
+        gen: int,
+        stats: List[Dict[str, Any]],
+        articles: ArticleSink,
+        tokenize: Tokenizer,
+        scorer: str,
+        version: str,
+    ) -> None:
+        self.pool = pool
+        self.gen = gen
+        self.articles = articles
+        self.tokenize = tokenize
+        self.scorer = scorer
+        self.version = version
+        self.vectors: Any = None
+        self.ann: Any = None
+        self.fuzzy: Optional["TrigramIndex"] = None
+        self.doc_count = sum(s["docs"] for s in stats)
+        self.total_length = sum(s["total_length"] for s in stats)
+        self.field_totals = {f: sum(s["field_totals"][f] for s in stats) for f in FIELDS}
+        self.df: Dict[str, int] = {}
+        for s in stats:
+            for term, df in s["df"].items():
+                self.df[term] = self.df.get(term, 0) + df
+        self._active = 0
+        self._retired = False
+        self._dropped = False
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.doc_count
+
+    @property
+    def avg_length(self) -> float:
+        return self.total_length / self.doc_count if self.doc_count else 0.0
+
+    def field_avg_lengths(self) -> Dict[str, float]:
+        n = self.doc_count
+        return {f: self.field_totals[f] / n if n else 0.0 for f in FIELDS}
+
+    def doc_freqs(self) -> Dict[str, int]:
+        return self.df
+
+    def idf(self, term: str) -> float:
+        df = self.df.get(term, 0)
+        return math.log(1.0 + (self.doc_count - df + 0.5) / (df + 0.5))
+
+    @contextmanager
+    def lease(self) -> Iterator[None]:
+        """Keep this generation loaded in the workers until the block exits.
+
+        Raises GenerationRetired once a retired generation has been dropped.
+        """
+        with self._lock:
+            if self._dropped:
+                raise GenerationRetired(f"KB generation {self.gen} is no longer loaded")
+            self._active += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active -= 1
+                release = self._retired and self._active == 0 and not self._dropped
+                self._dropped = self._dropped or release
+            if release:
+                self.pool.drop(self.gen)
+
+    def retire(self) -> None:
+        """Free this generation in the workers once in-flight queries finish."""
+        with self._lock:
+            self._retired = True
+            release = self._active == 0 and not self._dropped
+            self._dropped = self._dropped or release
+        if release:
+            self.pool.drop(self.gen)
+
+    def query_terms(self, query: str) -> Set[str]:
+        tokens = self.tokenize(query)
+        return self.fuzzy.expand(tokens) if self.fuzzy is not None else set(tokens)
+
+    def rank_batch(
+        self,
+        queries: Sequence[str],
+        top_k: int = 3,
+        scorer: Optional[str] = None,
+        doc_filter: Optional[DocFilter] = None,
+    ) -> List[Tuple[List[Tuple[int, float]], float]]:
+        token_sets = [sorted(t for t in self.query_terms(q) if t in self.df) for q in queries]
+        idfs = {t: self.idf(t) for tokens in token_sets for t in tokens}
+        with self.lease():
+            return self.pool.rank_batch(
+                self.gen,
+                token_sets,
+                scorer or self.scorer,
+                idfs,
+                self.avg_length,
+                self.field_avg_lengths(),
+                max(1, top_k),
+                doc_filter,
+            )
+
+    def rank(
+        self,
+        query: str,
+        top_k: int = 3,
+        scorer: Optional[str] = None,
+        doc_filter: Optional[DocFilter] = None,
+        stages: Optional[Dict[str, float]] = None,
+    ) -> List[Tuple[int, float]]:
+        start = time.perf_counter()
+        q_tokens: Set[str] = {t for t in self.query_terms(query) if t in self.df}
+        record_stage(stages, "tokenize", start)
+        if not q_tokens:
+            return []
+        idfs = {t: self.idf(t) for t in q_tokens}
+        with self.lease():
+            return self.pool.rank(
+                self.gen,
+                sorted(q_tokens),
+                scorer or self.scorer,
+                idfs,
+                self.avg_length,
+                self.field_avg_lengths(),
+                max(1, top_k),
+                doc_filter,
+                stages,
+            )
+
+    def explain(
+        self, query: str, doc_ids: Sequence[int], scorer: Optional[str] = None
+    ) -> Dict[int, Dict[str, Any]]:
+        q_tokens = sorted(t for t in self.query_terms(query) if t in self.df)
+        idfs = {t: self.idf(t) for t in q_tokens}
+        with self.lease():
+            return self.pool.explain(
+                self.gen, q_tokens, scorer or self.scorer, idfs, self.avg_length, self.field_avg_lengths(), doc_ids
+            )
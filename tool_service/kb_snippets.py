@@ -0,0 +1,82 @@
+import re
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+
+# A passage is a sentence or line, including its closing punctuation
+_PASSAGE_RE = re.compile(r"[^.!?\n]+[.!?]*")
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+def _passage_matches(passage: str, terms: Set[str], tokenize: Callable[[str], List[str]]) -> Tuple[Set[str], List[List[int]]]:
+    hit: Set[str] = set()
+    spans: List[List[int]] = []
+    for m in _WORD_RE.finditer(passage):
+        toks = tokenize(m.group())
+        if toks and toks[0] in terms:
+            hit.add(toks[0])
+            spans.append([m.start(), m.end()])
+    return hit, spans
+
+
+def extract_snippets(
+    text: str,
+    terms: Set[str],
+    tokenize: Callable[[str], List[str]],
+    max_chars: int = 300,
+    max_snippets: int = 3,
+) -> List[Dict[str, Any]]:
+    """Pick the passages of `text` matching the most query terms, within `max_chars`.
+
+    Each snippet carries `offset` (its start in `text`) and `matches`, the
+    [start, end) spans of matched words relative to the snippet, for
+    highlighting. Snippets are returned in document order.
+    """
+    scored = []
+    for m in _PASSAGE_RE.finditer(text):
+        raw = m.group()
+        lead = len(raw) - len(raw.lstrip())
+        passage = raw.strip()
+        if not passage:
+            continue
+        hit, spans = _passage_matches(passage, terms, tokenize)
+        if spans:
+            scored.append((len(hit), len(spans), m.start() + lead, passage, spans))
+    if not scored:
+        passage = text.strip()[:max_chars]
+        return [{"text": passage, "offset": len(text) - len(text.lstrip()), "matches": []}] if passage else []
+
+    scored.sort(key=lambda x: (-x[0], -x[1], x[2]))
+    budget = max_chars
+    out: List[Dict[str, Any]] = []
+    for _, _, offset, passage, spans in scored:
+        if budget <= 0 or len(out) >= max_snippets:
+            break
+        if len(passage) > budget:
+            # Cut a window that starts a little before the first match
+            lo = max(0, min(spans[0][0] - budget // 4, len(passage) - budget))
+            if lo > 0:
+                space = passage.find(" ", lo, spans[0][0])
+                lo = space + 1 if space != -1 else lo
+            hi = lo + budget
+            if hi < len(passage):
+                space = passage.rfind(" ", spans[0][1], hi)
+                hi = space if space != -1 else hi
+            passage = passage[lo:hi]
+            offset += lo
+            spans = [[s - lo, e - lo] for s, e in spans if s >= lo and e <= hi]
+            if not spans and out:
+                # Too little budget left to show a match, a bare fragment only costs tokens
+                break
+        out.append({"text": passage, "offset": offset, "matches": spans})
+        budget -= len(passage)
+    out.sort(key=lambda s: s["offset"])
+    return out
+
+
+def with_snippets(
+    art: Dict[str, Any], terms: Set[str], tokenize: Callable[[str], List[str]], max_chars: int
+) -> Dict[str, Any]:
+    """Copy of `art` with `body` replaced by query-aware `snippets`."""
+    out = {k: v for k, v in art.items() if k != "body"}
+    out["snippets"] = extract_snippets(art.get("body", ""), terms, tokenize, max_chars=max_chars)
+    return out
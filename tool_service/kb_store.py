@@ -0,0 +1,88 @@
+import glob
+import json
+import mmap
+import os
+import tempfile
+from array import array
+from typing import Any, Dict, Iterator, Sequence
+
+
+class ArticleStore:
+    """Read-only KB articles in one memory-mapped file.
+
+    Only byte offsets and lengths live in Python memory, or in a mapped index
+    file; an article is decoded from the mapping when it is looked up, which
+    in practice is only for the `top_k` results of a search. Workers mapping the same file share
+    its pages through the OS page cache.
+    """
+
+    def __init__(self, path: str, offsets: Sequence[int], lengths: Sequence[int]) -> None:
+        self.path = path
+        self.offsets = offsets
+        self.lengths = lengths
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            # mmap cannot map an empty file
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, doc_id: int) -> Dict[str, Any]:
+        start = self.offsets[doc_id]
+        return json.loads(self._mm[start : start + self.lengths[doc_id]])
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for doc_id in range(len(self)):
+            yield self[doc_id]
+
+
+class ArticleStoreWriter:
+    """Append articles to a new store file while the index is being built."""
+
+    def __init__(self, index_dir: str) -> None:
+        os.makedirs(index_dir, exist_ok=True)
+        fd, self._tmp = tempfile.mkstemp(dir=index_dir, prefix="kb_store.", suffix=".tmp")
+        self._f = os.fdopen(fd, "wb")
+        self._pos = 0
+        self.offsets = array("q")
+        self.lengths = array("q")
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def append(self, art: Dict[str, Any]) -> None:
+        data = json.dumps(art, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        self._f.write(data)
+        self.offsets.append(self._pos)
+        self.lengths.append(len(data))
+        self._pos += len(data)
+
+    def finish(self, final_path: str) -> ArticleStore:
+        self._f.close()
+        if os.path.exists(final_path) and os.path.getsize(final_path) == self._pos:
+            # Another worker already wrote this KB version; map its file so pages are shared
+            os.remove(self._tmp)
+        else:
+            os.replace(self._tmp, final_path)
+        return ArticleStore(final_path, self.offsets, self.lengths)
+
+    def abort(self) -> None:
+        self._f.close()
+        try:
+            os.remove(self._tmp)
+        except OSError:
+            pass
+
+
+def store_path(index_dir: str, version: str) -> str:
+    return os.path.join(index_dir, f"kb_store_{version}.bin")
+
+
+def prune_stores(index_dir: str, keep: str) -> None:
+    for stale in glob.glob(os.path.join(index_dir, "kb_store_*.bin")):
+        if stale != keep:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
@@ -0,0 +1,59 @@
+import math
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, List, Mapping, Optional
+
+
+# Most recent samples kept per stage
+DEFAULT_WINDOW = 1024
+
+
+def record_stage(stages: Optional[Dict[str, float]], name: str, start: float) -> float:
+    """Add the ms elapsed since `start` to `stages[name]`; returns now, the next stage's start."""
+    now = time.perf_counter()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + (now - start) * 1000.0
+    return now
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class StageTimings:
+    """Rolling window of per-stage KB query latencies, in ms.
+
+    Each stage keeps its last `window` samples, so the summary follows the
+    current load instead of averaging over the whole process lifetime.
+    """
+
+    def __init__(self, window: int = DEFAULT_WINDOW) -> None:
+        self.window = window
+        self._lock = threading.Lock()
+        self._samples: Dict[str, Deque[float]] = {}
+        self.queries = 0
+
+    def record(self, stages: Mapping[str, float]) -> None:
+        with self._lock:
+            self.queries += 1
+            for name, ms in stages.items():
+                samples = self._samples.get(name)
+                if samples is None:
+                    samples = self._samples[name] = deque(maxlen=self.window)
+                samples.append(ms)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            snapshot = {name: sorted(samples) for name, samples in self._samples.items()}
+        out = {}
+        for name, ordered in snapshot.items():
+            out[name] = {
+                "count": len(ordered),
+                "mean_ms": sum(ordered) / len(ordered),
+                "p50_ms": _percentile(ordered, 0.50),
+                "p95_ms": _percentile(ordered, 0.95),
+                "p99_ms": _percentile(ordered, 0.99),
+                "max_ms": ordered[-1],
+            }
+        return out
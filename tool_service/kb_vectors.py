@@ -0,0 +1,123 @@
+import glob
+import math
+import os
+import re
+import zlib
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+_WORD_RE = re.compile(r"[^\W_]+")
+
+
+class HashingEmbedder:
+    """Offline text embedder: hashed character n-grams projected to `dim` floats.
+
+    No model or network is needed, and the projection is deterministic across
+    processes (crc32, not `hash()`), so vectors can be persisted and shared.
+    """
+
+    def __init__(self, dim: int = 512, min_n: int = 3, max_n: int = 5) -> None:
+        self.dim = dim
+        self.min_n = min_n
+        self.max_n = max_n
+
+    def _features(self, text: str) -> Dict[int, float]:
+        words = _WORD_RE.findall(text.lower())
+        counts: Dict[int, float] = {}
+        grams: List[str] = list(words)
+        for w in words:
+            padded = f"<{w}>"
+            for n in range(self.min_n, self.max_n + 1):
+                grams.extend(padded[i : i + n] for i in range(len(padded) - n + 1))
+        for g in grams:
+            h = zlib.crc32(g.encode("utf-8"))
+            idx = h % self.dim
+            counts[idx] = counts.get(idx, 0.0) + (1.0 if h & 0x80000000 else -1.0)
+        return counts
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.embed_batch([text])[0]
+
+    def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for idx, v in self._features(text).items():
+                # Sublinear weighting keeps long bodies from drowning out titles
+                out[row, idx] = math.copysign(math.log1p(abs(v)), v)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+
+class VectorIndex:
+    """Row-aligned float32 embedding matrix over the KB, one row per doc id."""
+
+    def __init__(self, matrix: np.ndarray, embedder: HashingEmbedder) -> None:
+        self.matrix = matrix
+        self.embedder = embedder
+
+    def __len__(self) -> int:
+        return int(self.matrix.shape[0])
+
+    @classmethod
+    def build(cls, texts: Iterable[str], embedder: HashingEmbedder, batch_size: int = 1024) -> "VectorIndex":
+        batch: List[str] = []
+        chunks: List[np.ndarray] = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) >= batch_size:
+                chunks.append(embedder.embed_batch(batch))
+                batch = []
+        if batch or not chunks:
+            chunks.append(embedder.embed_batch(batch))
+        return cls(np.concatenate(chunks), embedder)
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp.{os.getpid()}.npy"
+        np.save(tmp, self.matrix)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, embedder: HashingEmbedder) -> "VectorIndex":
+        matrix = np.load(path, mmap_mode="r")
+        if matrix.ndim != 2 or matrix.shape[1] != embedder.dim or matrix.dtype != np.float32:
+            raise ValueError(f"Vector file {path} does not match embedder dim {embedder.dim}")
+        return cls(matrix, embedder)
+
+    def scores(self, query: str) -> np.ndarray:
+        return self.matrix @ self.embedder.embed(query)
+
+    def search(self, query: str, top_k: int = 3) -> List[Tuple[int, float]]:
+        if len(self) == 0:
+            return []
+        scores = self.scores(query)
+        k = min(max(1, top_k), scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.lexsort((top, -scores[top]))]
+        return [(int(d), float(scores[d])) for d in top if scores[d] > 0]
+
+
+def vector_cache_path(cache_dir: str, version: str, dim: int) -> str:
+    return os.path.join(cache_dir, f"kb_vectors_{version}_{dim}.npy")
+
+
+def load_or_build(
+    texts: Iterable[str], version: str, cache_dir: Optional[str], embedder: HashingEmbedder
+) -> VectorIndex:
+    """Memory-map the cached matrix for this KB version, building it on a miss."""
+    if not cache_dir:
+        return VectorIndex.build(texts, embedder)
+    path = vector_cache_path(cache_dir, version, embedder.dim)
+    if os.path.exists(path):
+        return VectorIndex.load(path, embedder)
+    VectorIndex.build(texts, embedder).save(path)
+    for stale in glob.glob(os.path.join(cache_dir, f"kb_vectors_*_{embedder.dim}.npy")):
+        if stale != path:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+    return VectorIndex.load(path, embedder)
@@ -1,10 +1,48 @@
+import base64
 import json
+import logging
 import os
 import sqlite3
+import threading
 import time
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass, field, replace
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar, Union
 
+from .db_pool import ConnectionPool
+from .ids import ULIDGenerator
+from .kb_ann import IVFIndex, ivf_base_path
+from .kb_cache import QueryCache, normalize_query
+from .kb_fts import FTSIndex, build_fts, fts_path, prune_fts
+from .kb_fuzzy import TrigramIndex
+from .kb_index import DEFAULT_FIELD_BOOSTS, DocFilter, KBIndex, article_text, reciprocal_rank_fusion
+from .kb_index_file import IndexFile
+from .kb_loader import KBFileReader, file_version
+from .kb_snippets import with_snippets
+from .kb_shards import GenerationRetired, ShardedKB, ShardPool, fork_available
+from .kb_store import ArticleStore, ArticleStoreWriter, prune_stores, store_path
+from .kb_timings import DEFAULT_WINDOW, StageTimings, record_stage
+from .kb_vectors import HashingEmbedder, VectorIndex, load_or_build
+from .tokenizer import get_tokenizer
+
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+KBSearcher = Union[KBIndex, ShardedKB, FTSIndex]
+
+KB_MODES = ("lexical", "vector", "hybrid")
+# "memory" indexes the KB in each process, "fts5" serves it from an SQLite FTS5 file under index_dir
+KB_BACKENDS = ("memory", "fts5")
+
+# Each retriever returns this many candidates per requested result before fusion
+HYBRID_DEPTH = 5
+# Vector candidates fetched per requested result when a tag/category filter drops some afterwards
+FILTER_DEPTH = 10
+# Ticket ids are this prefix plus a ULID. Older ids are t_<unix ms>, all digits, and any
+# letter after "t_" sorts above them, so new ids still sort after every existing one
+TICKET_ID_PREFIX = "t_u"
 
 @dataclass
 class Ticket:
@@ -16,17 +54,95 @@ class Ticket:
     created_at: float
 
 
+@dataclass
+class TicketPage:
+    tickets: List[Ticket]
+    # Opaque token for the page after this one, None on the last page
+    next_cursor: Optional[str] = None
+
+
+@dataclass
+class KBSearchResult:
+    results: List[Dict[str, Any]]
+    timings_ms: Dict[str, float] = field(default_factory=dict)
+    cached: bool = False
+    # Lexical query stages: tokenize, candidates, scoring, sort, serialize
+    stages_ms: Dict[str, float] = field(default_factory=dict)
+    # Per-result score breakdown by term and field, when asked for
+    explain: Optional[List[Dict[str, Any]]] = None
+
+
 class Storage:
-    def __init__(self, db_path: str, kb_path: str) -> None:
+    def __init__(
+        self,
+        db_path: str,
+        kb_path: str,
+        kb_scorer: str = "bm25",
+        kb_tokenizer: str = "simple",
+        kb_vectors: bool = False,
+        index_dir: Optional[str] = None,
+        compact_store: bool = False,
+        ann_nprobe: int = 0,
+        cache_size: int = 0,
+        cache_ttl: float = 300.0,
+        kb_shards: int = 0,
+        kb_fuzzy: bool = False,
+        kb_field_boosts: Optional[Dict[str, float]] = None,
+        index_file: Optional[str] = None,
+        kb_backend: str = "memory",
+        fts_prefix_min: int = 3,
+        timing_window: int = DEFAULT_WINDOW,
+    ) -> None:
+        if kb_backend not in KB_BACKENDS:
+            raise ValueError(f"Unknown KB backend: {kb_backend}")
+        if kb_backend == "fts5" and not index_dir:
+            raise ValueError("The fts5 KB backend needs an index directory")
         self.db_path = db_path
         self.kb_path = kb_path
+        self.kb_scorer = kb_scorer
+        self.kb_tokenizer = kb_tokenizer
+        self._tokenizer = get_tokenizer(kb_tokenizer)
+        self.index_dir = index_dir
+        # Article bodies go to a memory-mapped file under index_dir instead of the heap
+        self.compact_store = compact_store and bool(index_dir)
+        self.ann_nprobe = ann_nprobe
+        if kb_backend == "fts5" and kb_fuzzy:
+            # The FTS vocabulary is stemmed by FTS5, not by our tokenizer, and prefix
+            # matching already covers partial words
+            logger.warning("KB_FUZZY is ignored with the fts5 backend")
+            kb_fuzzy = False
+        self.kb_fuzzy = kb_fuzzy
+        self.kb_field_boosts = dict(DEFAULT_FIELD_BOOSTS if kb_field_boosts is None else kb_field_boosts)
+        # A prebuilt index file is served instead of indexing kb_path, see kb_index_file
+        self.index_file = index_file
+        self.kb_backend = kb_backend
+        self.fts_prefix_min = fts_prefix_min
+        self._embedder = HashingEmbedder() if kb_vectors else None
+        self._cache: Optional[QueryCache[KBSearchResult]] = (
+            QueryCache(max_entries=cache_size, ttl=cache_ttl) if cache_size > 0 else None
+        )
+        self._timings = StageTimings(timing_window)
+        self._search_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="kb-search") if kb_vectors else None
+        self._db = ConnectionPool(db_path)
+        self._ticket_ids = ULIDGenerator()
         self._init_db()
-        self._kb = self._load_kb()
+        self._reload_lock = threading.Lock()
+        self._watcher: Optional[threading.Thread] = None
+        self._watcher_stop = threading.Event()
+        self._kb_signature = self._stat_kb()
+        if (index_file or kb_backend != "memory") and kb_shards > 1:
+            logger.warning("KB_SHARDS is ignored when serving a prebuilt index file or the fts5 backend")
+            kb_shards = 0
+        if kb_shards > 1 and not fork_available():
+            logger.warning("KB_SHARDS is ignored on platforms without fork, lexical search stays in-process")
+            kb_shards = 0
+        # Started before the first build and before any thread, see kb_shards._mp_context
+        self._shards = ShardPool(kb_shards) if kb_shards > 1 else None
+        self._index = self._build_index()
 
     def _connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        # The calling thread's pooled connection; `with` on it scopes a transaction, it does not close it
+        return self._db.connection()
 
     def _init_db(self) -> None:
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
@@ -43,51 +159,412 @@ class Storage:
                 )
                 """
             )
+            # Listing filters on status and/or priority and returns newest first; id breaks created_at ties
+            conn.execute("CREATE INDEX IF NOT EXISTS tickets_created_at ON tickets (created_at, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS tickets_status ON tickets (status, created_at, id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS tickets_priority ON tickets (priority, created_at, id)")
+            # The open queue by priority, without the much larger closed backlog
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS tickets_open_priority ON tickets (priority, created_at, id) "
+                "WHERE status = 'open'"
+            )
             conn.commit()
 
-    def _load_kb(self) -> List[Dict[str, Any]]:
-        with open(self.kb_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-
-    @staticmethod # TODO: Use an embedding model's tokenizer instead of manual tokenization
-    def _tokenize(text: str) -> List[str]:
-        out: List[str] = []
-        cur: List[str] = []
-        for ch in text.lower():
-            if ch.isalnum():
-                cur.append(ch)
+    def _load_kb(self) -> KBFileReader:
+        return KBFileReader(self.kb_path)
+
+    def _stat_kb(self) -> Tuple[int, int]:
+        st = os.stat(self.index_file or self.kb_path)
+        return st.st_mtime_ns, st.st_size
+
+    def _build_index(self) -> "KBSearcher":
+        if self.kb_backend == "fts5":
+            index = self._open_fts()
+        elif self.index_file:
+            index = self._open_index_file()
+        elif self._shards is not None:
+            index = self._build_sharded()
+        else:
+            index = self._build_local()
+        version = index.version
+        if self.kb_fuzzy and index.fuzzy is None:
+            index.fuzzy = TrigramIndex.build(index.doc_freqs())
+        if self._embedder is not None and index.vectors is None:
+            texts = (article_text(a) for a in index.articles)
+            index.vectors = load_or_build(texts, version, self.index_dir, self._embedder)
+        # Vectors may also come from a prebuilt index file, the ANN index is loaded either way
+        if self._embedder is not None and index.vectors is not None and self.ann_nprobe > 0 and self.index_dir:
+            base = ivf_base_path(self.index_dir, version, self._embedder.dim)
+            if os.path.exists(f"{base}.npz"):
+                index.ann = IVFIndex.load(base, self._embedder, nprobe=self.ann_nprobe)
             else:
-                if cur:
-                    out.append("".join(cur))
-                    cur = []
-        if cur:
-            out.append("".join(cur))
-        return out
+                logger.warning("No IVF index for KB version %s, vector search stays brute force", version)
+        return index
+
+    def _open_fts(self) -> FTSIndex:
+        assert self.index_dir is not None
+        # Built once per KB version and tokenizer, then shared by every worker
+        path = fts_path(self.index_dir, file_version(self.kb_path), self.kb_tokenizer)
+        if not os.path.exists(path):
+            build_fts(self.kb_path, path, self.kb_tokenizer)
+            prune_fts(self.index_dir, keep=path)
+        return FTSIndex(
+            path,
+            self._tokenizer,
+            scorer=self.kb_scorer,
+            field_boosts=self.kb_field_boosts,
+            prefix_min=self.fts_prefix_min,
+        )
+
+    def _open_index_file(self) -> KBIndex:
+        assert self.index_file is not None
+        f = IndexFile(self.index_file)
+        if f.tokenizer != self.kb_tokenizer:
+            raise ValueError(f"{self.index_file} was built with the {f.tokenizer} tokenizer, not {self.kb_tokenizer}")
+        index = f.kb_index(self._tokenizer, scorer=self.kb_scorer, field_boosts=self.kb_field_boosts)
+        if self.kb_fuzzy:
+            index.fuzzy = f.trigram_index()
+        matrix = f.vectors()
+        if self._embedder is not None and matrix is not None and matrix.shape[1] == self._embedder.dim:
+            index.vectors = VectorIndex(matrix, self._embedder)
+        return index
+
+    def _build_local(self) -> KBIndex:
+        reader = self._load_kb()
+        writer = ArticleStoreWriter(self.index_dir) if self.compact_store else None
+        try:
+            # Articles are parsed and indexed one at a time, the file is never held whole
+            index = KBIndex(
+                reader, self._tokenizer, scorer=self.kb_scorer, sink=writer, field_boosts=self.kb_field_boosts
+            )
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            raise
+        index.version = reader.version or ""
+        if writer is not None:
+            index.articles = self._finish_store(writer, index.version)
+        return index
+
+    def _build_sharded(self) -> ShardedKB:
+        assert self._shards is not None
+        # Shards index their slices while this process only copies articles into the store
+        gen, pending = self._shards.start_load(self.kb_path, self.kb_tokenizer, self.kb_scorer, self.kb_field_boosts)
+        reader = self._load_kb()
+        writer = ArticleStoreWriter(self.index_dir) if self.compact_store else None
+        articles: Any = writer if writer is not None else []
+        try:
+            for art in reader:
+                articles.append(art)
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            try:
+                self._shards.finish_load(gen, pending)
+            except Exception:
+                pass  # finish_load already dropped the generation
+            else:
+                self._shards.drop(gen)
+            raise
+        version = reader.version or ""
+        stats = self._shards.finish_load(gen, pending)
+        if any(st["version"] != version for st in stats):
+            if writer is not None:
+                writer.abort()
+            self._shards.drop(gen)
+            raise ValueError("KB file changed while the shards were loading it")
+        if writer is not None:
+            articles = self._finish_store(writer, version)
+        return ShardedKB(self._shards, gen, stats, articles, self._tokenizer, self.kb_scorer, version)
+
+    def _finish_store(self, writer: ArticleStoreWriter, version: str) -> ArticleStore:
+        path = store_path(self.index_dir, version)
+        store = writer.finish(path)
+        prune_stores(self.index_dir, keep=path)
+        return store
+
+    @property
+    def kb_version(self) -> str:
+        return self._index.version
+
+    def kb_info(self) -> Dict[str, Any]:
+        index = self._index
+        return {"version": index.version, "articles": len(index)}
+
+    def reload_kb(self, force: bool = False) -> bool:
+        """Rebuild the KB index if the file changed and swap it in.
+
+        Readers never take the lock: they lease `self._index` once per query,
+        so in-flight searches finish on the old index, which is freed when the
+        last of them releases it.
+        """
+        with self._reload_lock:
+            signature = self._stat_kb()
+            if not force and signature == self._kb_signature:
+                return False
+            # Recorded before building so a broken file is only retried once it changes again
+            self._kb_signature = signature
+            index = self._build_index()
+            old = self._index
+            if not force and index.version == old.version:
+                _retire(index)
+                return False
+            self._index = index
+            _retire(old)
+        logger.info("KB reloaded: version=%s articles=%d", index.version, len(index))
+        return True
+
+    def start_kb_watcher(self, interval: float) -> None:
+        if self._watcher is not None:
+            return
+        self._watcher_stop.clear()
+        self._watcher = threading.Thread(target=self._watch_kb, args=(interval,), name="kb-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_kb_watcher(self) -> None:
+        if self._watcher is None:
+            return
+        self._watcher_stop.set()
+        self._watcher.join()
+        self._watcher = None
+
+    def close(self) -> None:
+        self.stop_kb_watcher()
+        if self._search_pool is not None:
+            self._search_pool.shutdown(wait=False)
+        if self._shards is not None:
+            self._shards.close()
+        self._db.close()
+
+    def _watch_kb(self, interval: float) -> None:
+        while not self._watcher_stop.wait(interval):
+            try:
+                self.reload_kb()
+            except Exception:
+                logger.exception("KB reload failed, still serving version %s", self.kb_version)
 
     # TODO: Migrate to a vector DB once available
-    def kb_search(self, query: str, top_k: int = 3) -> List[Dict[str, Any]]:
-        q_tokens = set(self._tokenize(query))
-        scored: List[Tuple[int, Dict[str, Any]]] = []
-        for art in self._kb:
-            hay = " ".join([art.get("title", ""), " ".join(art.get("tags", [])), art.get("body", "")])
-            a_tokens = set(self._tokenize(hay))
-            score = len(q_tokens.intersection(a_tokens))
-            if score > 0:
-                scored.append((score, art))
-        scored.sort(key=lambda x: x[0], reverse=True)
-        return [a for _, a in scored[: max(1, top_k)]]
+    def kb_search(
+        self,
+        query: str,
+        top_k: int = 3,
+        scorer: Optional[str] = None,
+        mode: str = "lexical",
+        snippet_chars: int = 0,
+        tags: Optional[Sequence[str]] = None,
+        categories: Optional[Sequence[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        return self.kb_query(
+            query,
+            top_k=top_k,
+            scorer=scorer,
+            mode=mode,
+            snippet_chars=snippet_chars,
+            tags=tags,
+            categories=categories,
+        ).results
+
+    def kb_query(
+        self,
+        query: str,
+        top_k: int = 3,
+        scorer: Optional[str] = None,
+        mode: str = "lexical",
+        snippet_chars: int = 0,
+        tags: Optional[Sequence[str]] = None,
+        categories: Optional[Sequence[str]] = None,
+        explain: bool = False,
+    ) -> KBSearchResult:
+        """Search the KB. With `snippet_chars` > 0 each result's body is replaced
+        by the passages best matching the query, within that many characters.
+        `tags` and `categories` restrict results to articles with any of those
+        tags and in one of those categories, matched case-insensitively.
+        `explain` skips the cache and breaks each lexical score down by term
+        and field."""
+        if mode not in KB_MODES:
+            raise ValueError(f"Unknown KB search mode: {mode}")
+        if explain and mode != "lexical":
+            raise ValueError("explain is only available for lexical search")
+        start = time.perf_counter()
+        with self._current_index() as index:
+            if mode != "lexical" and index.vectors is None:
+                raise ValueError("Vector retrieval is not enabled")
+            doc_filter = DocFilter.of(tags, categories)
+            if explain:
+                res = self._run_query(index, query, max(1, top_k), scorer, mode, doc_filter, explain=True)
+            else:
+                res = self._cached_query(index, query, max(1, top_k), scorer, mode, doc_filter)
+            stages = dict(res.stages_ms)
+            snippets_start = time.perf_counter()
+            res = _snippets(index, query, res, snippet_chars)
+            record_stage(stages, "serialize", snippets_start)
+        self._timings.record({**res.timings_ms, **stages, "total": (time.perf_counter() - start) * 1000.0})
+        return replace(res, stages_ms=stages)
+
+    def kb_query_batch(
+        self,
+        queries: List[str],
+        top_k: int = 3,
+        scorer: Optional[str] = None,
+        mode: str = "lexical",
+        snippet_chars: int = 0,
+        tags: Optional[Sequence[str]] = None,
+        categories: Optional[Sequence[str]] = None,
+    ) -> List[KBSearchResult]:
+        """`kb_query` for several queries against one KB version, results in input order.
+
+        Repeated queries are answered once, and lexical queries missing from
+        the cache are ranked in one batch so postings they share are scored once.
+        The tag and category filter applies to every query.
+        """
+        if mode not in KB_MODES:
+            raise ValueError(f"Unknown KB search mode: {mode}")
+        with self._current_index() as index:
+            if mode != "lexical" and index.vectors is None:
+                raise ValueError("Vector retrieval is not enabled")
+            top_k = max(1, top_k)
+            doc_filter = DocFilter.of(tags, categories)
+            keys = [_cache_key(index, query, top_k, scorer, mode, doc_filter) for query in queries]
+            resolved: Dict[Tuple[Any, ...], KBSearchResult] = {}
+            misses: Dict[Tuple[Any, ...], str] = {}
+            for key, query in zip(keys, queries):
+                if key in resolved or key in misses:
+                    continue
+                hit = self._cache.get(key, index.version) if self._cache is not None else None
+                if hit is not None:
+                    resolved[key] = KBSearchResult(hit.results, cached=True)
+                else:
+                    misses[key] = query
+            if mode == "lexical":
+                ranked = index.rank_batch(list(misses.values()), top_k, scorer, doc_filter)
+                results = [KBSearchResult([index.articles[d] for d, _ in top], {"lexical": ms}) for top, ms in ranked]
+            else:
+                results = [self._run_query(index, query, top_k, scorer, mode, doc_filter) for query in misses.values()]
+            for key, res in zip(misses, results):
+                self._timings.record(res.timings_ms)
+                if self._cache is not None:
+                    self._cache.put(key, index.version, res)
+                resolved[key] = res
+            return [_snippets(index, query, resolved[key], snippet_chars) for key, query in zip(keys, queries)]
+
+    @contextmanager
+    def _current_index(self) -> Iterator[KBSearcher]:
+        """The current index, leased so a concurrent reload cannot free it before the block exits."""
+        with ExitStack() as stack:
+            while True:
+                index = self._index
+                try:
+                    stack.enter_context(index.lease())
+                    break
+                except GenerationRetired:
+                    # reload_kb publishes the new index before retiring the old one, so reading again gets it
+                    if index is self._index:
+                        raise
+            yield index
+
+    def _cached_query(
+        self,
+        index: KBSearcher,
+        query: str,
+        top_k: int,
+        scorer: Optional[str],
+        mode: str,
+        doc_filter: Optional[DocFilter] = None,
+    ) -> KBSearchResult:
+        if self._cache is None:
+            return self._run_query(index, query, top_k, scorer, mode, doc_filter)
+        key = _cache_key(index, query, top_k, scorer, mode, doc_filter)
+        hit = self._cache.get(key, index.version)
+        if hit is not None:
+            return KBSearchResult(hit.results, cached=True)
+        res = self._run_query(index, query, top_k, scorer, mode, doc_filter)
+        self._cache.put(key, index.version, res)
+        return res
+
+    def kb_cache_stats(self) -> Optional[Dict[str, int]]:
+        return self._cache.stats() if self._cache is not None else None
+
+    def kb_timing_stats(self) -> Dict[str, Any]:
+        """Latency summary per query stage over the last `window` queries."""
+        timings = self._timings
+        return {"queries": timings.queries, "window": timings.window, "stages": timings.summary()}
+
+    def _run_query(
+        self,
+        index: KBSearcher,
+        query: str,
+        top_k: int,
+        scorer: Optional[str],
+        mode: str,
+        doc_filter: Optional[DocFilter] = None,
+        explain: bool = False,
+    ) -> KBSearchResult:
+        if mode == "lexical":
+            stages: Dict[str, float] = {}
+            ranked, ms = _timed(index.rank, query, top_k, scorer, doc_filter, stages)
+            start = time.perf_counter()
+            results = [index.articles[d] for d, _ in ranked]
+            start = record_stage(stages, "serialize", start)
+            res = KBSearchResult(results, {"lexical": ms}, stages_ms=stages)
+            if explain:
+                breakdown = index.explain(query, [d for d, _ in ranked], scorer)
+                res.explain = [{"id": art.get("id"), **breakdown[d]} for (d, _), art in zip(ranked, results)]
+                record_stage(stages, "explain", start)
+            return res
+        if mode == "vector":
+            ranked, ms = _timed(self._vector_rank, index, query, top_k, doc_filter)
+            return KBSearchResult([index.articles[d] for d, _ in ranked], {"vector": ms})
+
+        depth = top_k * HYBRID_DEPTH
+        # Vector scoring is mostly NumPy and releases the GIL, so it overlaps the lexical pass
+        vector_future = self._search_pool.submit(_timed, self._vector_rank, index, query, depth, doc_filter)
+        stages = {}
+        lexical, lexical_ms = _timed(index.rank, query, depth, scorer, doc_filter, stages)
+        vector, vector_ms = vector_future.result()
+        fused = reciprocal_rank_fusion([[d for d, _ in lexical], [d for d, _ in vector]])
+        start = time.perf_counter()
+        results = [index.articles[d] for d, _ in fused[:top_k]]
+        record_stage(stages, "serialize", start)
+        return KBSearchResult(results, {"lexical": lexical_ms, "vector": vector_ms}, stages_ms=stages)
+
+    @staticmethod
+    def _vector_rank(
+        index: KBSearcher, query: str, top_k: int, doc_filter: Optional[DocFilter] = None
+    ) -> List[Tuple[int, float]]:
+        searcher = index.ann if index.ann is not None else index.vectors
+        if doc_filter is None:
+            return searcher.search(query, top_k=top_k)
+        # Vectors are not partitioned by label, so over-fetch and keep the articles passing the filter
+        hits = searcher.search(query, top_k=top_k * FILTER_DEPTH)
+        return [(d, s) for d, s in hits if doc_filter.matches(index.articles[d])][:top_k]
 
     def create_ticket(self, title: str, description: str, priority: str = "P2") -> Ticket:
-        ticket_id = f"t_{int(time.time() * 1000)}"
-        created_at = time.time()
-        status = "open"
+        return self.create_tickets([(title, description, priority)])[0]
+
+    def create_tickets(self, items: Sequence[Tuple[str, str, str]]) -> List[Ticket]:
+        """Insert (title, description, priority) tickets in one transaction, so one commit for the lot."""
+        tickets = []
+        for title, description, priority in items:
+            created_at = time.time()
+            # Time-ordered and unique even for creates in the same millisecond
+            ticket_id = TICKET_ID_PREFIX + self._ticket_ids.new(created_at)
+            tickets.append(
+                Ticket(
+                    id=ticket_id,
+                    title=title,
+                    description=description,
+                    priority=priority,
+                    status="open",
+                    created_at=created_at,
+                )
+            )
         with self._connect() as conn:
-            conn.execute(
+            conn.executemany(
                 "INSERT INTO tickets (id, title, description, priority, status, created_at) VALUES (?, ?, ?, ?, ?, ?)",
-                (ticket_id, title, description, priority, status, created_at),
+                [(t.id, t.title, t.description, t.priority, t.status, t.created_at) for t in tickets],
             )
             conn.commit()
-        return Ticket(id=ticket_id, title=title, description=description, priority=priority, status=status, created_at=created_at)
+        return tickets
 
     def get_ticket(self, ticket_id: str) -> Optional[Ticket]:
         with self._connect() as conn:
@@ -109,9 +586,40 @@ class Storage:
             conn.commit()
         return self.get_ticket(ticket_id)
 
-    def list_tickets(self, limit: int = 20) -> List[Ticket]:
+    def list_tickets(
+        self,
+        limit: int = 20,
+        status: Optional[str] = None,
+        priority: Optional[str] = None,
+        created_after: Optional[float] = None,
+        created_before: Optional[float] = None,
+        cursor: Optional[str] = None,
+    ) -> List[Ticket]:
+        return self.list_tickets_page(limit, status, priority, created_after, created_before, cursor).tickets
+
+    def list_tickets_page(
+        self,
+        limit: int = 20,
+        status: Optional[str] = None,
+        priority: Optional[str] = None,
+        created_after: Optional[float] = None,
+        created_before: Optional[float] = None,
+        cursor: Optional[str] = None,
+    ) -> TicketPage:
+        """Newest tickets first, optionally only those with `status`, `priority`
+        and `created_after <= created_at < created_before`.
+
+        Pages are keyset-based: `cursor`, the previous page's `next_cursor`,
+        holds the (created_at, id) of its last ticket and the query seeks past
+        it in the index, so every page costs the same however deep it is.
+        """
+        limit = max(1, limit)
+        after = decode_cursor(cursor) if cursor else None
+        # One extra row tells whether there is a next page
+        sql, params = ticket_list_query(limit + 1, status, priority, created_after, created_before, after)
         with self._connect() as conn:
-            rows = conn.execute("SELECT * FROM tickets ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+            rows = conn.execute(sql, params).fetchall()
+        next_cursor = encode_cursor(rows[limit - 1]["created_at"], rows[limit - 1]["id"]) if len(rows) > limit else None
         out: List[Ticket] = []
         for r in rows:
             out.append(
@@ -124,4 +632,78 @@ class Storage:
                     created_at=r["created_at"],
                 )
             )
-        return out
+        return TicketPage(out[:limit], next_cursor)
+
+
+def encode_cursor(created_at: float, ticket_id: str) -> str:
+    raw = json.dumps([created_at, ticket_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, str]:
+    try:
+        created_at, ticket_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(created_at), str(ticket_id)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid ticket cursor") from e
+
+
+def ticket_list_query(
+    limit: int,
+    status: Optional[str] = None,
+    priority: Optional[str] = None,
+    created_after: Optional[float] = None,
+    created_before: Optional[float] = None,
+    after: Optional[Tuple[float, str]] = None,
+) -> Tuple[str, List[Any]]:
+    """SQL and parameters of a `list_tickets_page` call; `after` is a decoded cursor."""
+    where: List[str] = []
+    params: List[Any] = []
+    if after is not None and created_before is not None:
+        # SQLite seeks on one upper bound only, so keep the tighter one
+        if after[0] < created_before:
+            created_before = None
+        else:
+            after = None
+    for clause, value in (
+        ("status = ?", status),
+        ("priority = ?", priority),
+        ("created_at >= ?", created_after),
+        ("created_at < ?", created_before),
+    ):
+        if value is not None:
+            where.append(clause)
+            params.append(value)
+    if after is not None:
+        where.append("(created_at, id) < (?, ?)")
+        params.extend(after)
+    sql = "SELECT * FROM tickets"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return f"{sql} ORDER BY created_at DESC, id DESC LIMIT ?", params + [limit]
+
+
+def _retire(index: KBSearcher) -> None:
+    # Local indexes are simply garbage collected; shard generations must be dropped
+    if isinstance(index, ShardedKB):
+        index.retire()
+
+
+def _cache_key(
+    index: KBSearcher, query: str, top_k: int, scorer: Optional[str], mode: str, doc_filter: Optional[DocFilter] = None
+) -> Tuple[Any, ...]:
+    return (normalize_query(query), top_k, scorer or index.scorer, mode, doc_filter)
+
+
+def _snippets(index: KBSearcher, query: str, res: KBSearchResult, snippet_chars: int) -> KBSearchResult:
+    if snippet_chars <= 0:
+        return res
+    terms = index.query_terms(query)
+    results = [with_snippets(a, terms, index.tokenize, snippet_chars) for a in res.results]
+    return replace(res, results=results)
+
+
+def _timed(fn: Callable[..., T], *args: Any) -> Tuple[T, float]:
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, (time.perf_counter() - start) * 1000.0
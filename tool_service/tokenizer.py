@@ -0,0 +1,123 @@
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, List, Optional, Sequence
+
+
+# Runs of alphanumerics, same boundaries as the original str.isalnum() scan
+_TOKEN_RE = re.compile(r"[^\W_]+")
+# ASCII fast path: map every non-alphanumeric to a space, then str.split()
+_ASCII_TABLE = {i: " " for i in range(128) if not chr(i).isalnum()}
+# Unit separator marks document boundaries in a batch, so the batch table keeps it
+_DOC_SEP = "\x1f"
+_ASCII_BATCH_TABLE = {i: c for i, c in _ASCII_TABLE.items() if chr(i) != _DOC_SEP}
+
+ENGLISH_STOPWORDS: FrozenSet[str] = frozenset(
+    """
+    a an and are as at be been but by can could did do does for from had has have how i if in into is it its
+    me my no not of on or our so than that the their them then there these they this to was we were what when
+    where which while who why will with would you your
+    """.split()
+)
+
+
+def light_stem(word: str) -> str:
+    """Harman S-stemmer: folds plurals without touching other suffixes."""
+    if len(word) <= 3 or not word.endswith("s"):
+        return word
+    if word.endswith("ies") and not word.endswith(("eies", "aies")):
+        return word[:-3] + "y"
+    if word.endswith("es") and not word.endswith(("aes", "ees", "oes")):
+        return word[:-1]
+    if word.endswith(("us", "ss", "is")):
+        return word
+    return word[:-1]
+
+
+# Distinct words whose stems are kept; queries keep bringing new ones, so the cache is bounded
+STEM_CACHE_SIZE = 65536
+_cached_stem = lru_cache(maxsize=STEM_CACHE_SIZE)(light_stem)
+
+
+class Tokenizer:
+    """Regex tokenizer with optional Unicode normalization, stopwords and stemming.
+
+    Instances are callables, so anything taking `Callable[[str], List[str]]`
+    (for example `KBIndex`) accepts them. ASCII text goes through
+    `str.translate` + `str.split`, other text through a Unicode regex.
+    `tokenize_batch` lowercases and splits many documents in one pass and is
+    what the index builder uses.
+    """
+
+    def __init__(
+        self,
+        normalize: Optional[str] = None,
+        strip_accents: bool = False,
+        stopwords: FrozenSet[str] = frozenset(),
+        stem: bool = False,
+    ) -> None:
+        self.normalize = normalize
+        self.strip_accents = strip_accents
+        self.stopwords = stopwords
+        self.stem = stem
+
+    def _prepare(self, text: str) -> str:
+        text = text.lower()
+        if self.normalize and not text.isascii():
+            text = unicodedata.normalize(self.normalize, text)
+            if self.strip_accents:
+                text = "".join(ch for ch in text if not unicodedata.combining(ch))
+        return text
+
+    def _finish(self, tokens: List[str]) -> List[str]:
+        if self.stopwords:
+            stop = self.stopwords
+            tokens = [t for t in tokens if t not in stop]
+        if self.stem:
+            tokens = [_cached_stem(t) for t in tokens]
+        return tokens
+
+    def __call__(self, text: str) -> List[str]:
+        text = self._prepare(text)
+        if text.isascii():
+            return self._finish(text.translate(_ASCII_TABLE).split())
+        return self._finish(_TOKEN_RE.findall(text))
+
+    def tokenize(self, text: str) -> List[str]:
+        return self(text)
+
+    def tokenize_batch(self, texts: Sequence[str]) -> List[List[str]]:
+        if not texts:
+            return []
+        joined = self._prepare(_DOC_SEP.join(texts))
+        docs = joined.split(_DOC_SEP)
+        if len(docs) != len(texts):
+            # A document contained the separator itself
+            return [self(t) for t in texts]
+        if joined.isascii():
+            docs = joined.translate(_ASCII_BATCH_TABLE).split(_DOC_SEP)
+            return [self._finish(d.split()) for d in docs]
+        return [self._finish(_TOKEN_RE.findall(d)) for d in docs]
+
+
+TOKENIZERS: Dict[str, Callable[[], Tokenizer]] = {
+    # Matches the original Storage._tokenize output exactly
+    "simple": lambda: Tokenizer(),
+    "english": lambda: Tokenizer(normalize="NFKD", strip_accents=True, stopwords=ENGLISH_STOPWORDS, stem=True),
+}
+
+
+def get_tokenizer(name: str) -> Tokenizer:
+    try:
+        return TOKENIZERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown tokenizer: {name}") from None
+
+
+def tokenize_batch(tokenize: Callable[[str], List[str]], texts: Sequence[str]) -> List[List[str]]:
+    """Use the tokenizer's batch path when it has one, else tokenize one by one."""
+    batch = getattr(tokenize, "tokenize_batch", None)
+    if batch is not None:
+        return batch(texts)
+    return [tokenize(t) for t in texts]
+